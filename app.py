@@ -14,21 +14,19 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# Injetar CSS customizado
-CSS_PATH = os.path.join(os.path.dirname(__file__), "assets", "style.css")
-if os.path.exists(CSS_PATH):
-    with open(CSS_PATH) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
-# Auto-setup do banco se não existir
-sys.path.insert(0, os.path.dirname(__file__))
-from utils.database import db_exists
-
-if not db_exists():
-    st.warning("⚠️ Banco de dados não encontrado. Configurando...")
-    from setup_database import create_database
-    create_database()
-    st.success("✅ Banco criado com sucesso! Recarregue a página.")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from utils.assets import load_css
+from utils.database import FAIXAS_ETARIAS, check_readiness
+
+# Injetar CSS customizado (lido do disco uma vez por processo)
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# Readiness check: o setup do banco roda fora do request (python setup_database.py)
+ready, motivo = check_readiness()
+if not ready:
+    st.error(f"⚠️ {motivo} Execute `python setup_database.py` e recarregue a página.")
     st.stop()
 
 # --- SIDEBAR (Filtros Globais) ---
@@ -86,10 +84,23 @@ contract_idx = st.sidebar.selectbox("Tipo de Contrato", range(len(CONTRACTS)), f
 selected_contract = CONTRACTS[contract_idx][0]
 
 # Faixa Etária
-AGE_RANGES = [("todos", "Todas"), ("<25", "< 25 anos"), ("25-35", "25-35 anos"), ("35-45", "35-45 anos"), ("45-60", "45-60 anos"), ("60+", "60+ anos"), (">60", "> 60 anos")]
+AGE_RANGES = [("todos", "Todas")] + [(faixa, f"{faixa} anos") for faixa in FAIXAS_ETARIAS]
 age_idx = st.sidebar.selectbox("Faixa Etária", range(len(AGE_RANGES)), format_func=lambda i: AGE_RANGES[i][1])
 selected_age = AGE_RANGES[age_idx][0]
 
+st.sidebar.markdown("---")
+st.sidebar.markdown("##### ⚡ Exploração")
+approx_mode = st.sidebar.checkbox(
+    "Modo aproximado",
+    value=False,
+    help="Mostra estimativas da amostra estratificada (IC 95%) enquanto o resultado exato carrega.",
+)
+out_of_core = st.sidebar.checkbox(
+    "Modo out-of-core",
+    value=False,
+    help="Agrega o banco em chunks, sem carregar os contratos na memória (bases maiores que a RAM).",
+)
+
 # Guardar filtros no session_state
 st.session_state["filters"] = {
     "year": selected_year,
@@ -98,6 +109,8 @@ st.session_state["filters"] = {
     "contractType": selected_contract,
     "ageRange": selected_age,
 }
+st.session_state["approx_mode"] = approx_mode
+st.session_state["out_of_core"] = out_of_core
 
 # --- PÁGINA PRINCIPAL ---
 st.markdown("""
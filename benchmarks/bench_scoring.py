@@ -0,0 +1,49 @@
+"""
+Benchmark — Throughput do score de risco em batch
+Execute: python benchmarks/bench_scoring.py [linhas]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.scoring import BATCH_SIZE, score_arrays
+
+REPEAT = 3
+
+
+def synthetic_columns(n: int, seed: int = 42) -> dict:
+    """Colunas com distribuições próximas às de application_data."""
+    rng = np.random.default_rng(seed)
+    ext = rng.uniform(0, 1, size=(n, 3))
+    ext[rng.random((n, 3)) < 0.3] = np.nan
+    renda = rng.lognormal(11.9, 0.5, n)
+    credito = rng.lognormal(13.0, 0.6, n)
+    return {
+        "ext": ext,
+        "renda": renda,
+        "credito": credito,
+        "anuidade": credito / rng.uniform(10, 40, n),
+        "taxa_segmento": rng.uniform(0.02, 0.15, n),
+        "taxa_global": 0.08,
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    cols = synthetic_columns(n)
+
+    for batch_size in [BATCH_SIZE // 4, BATCH_SIZE, BATCH_SIZE * 4]:
+        tempos = []
+        for _ in range(REPEAT):
+            inicio = time.perf_counter()
+            score_arrays(batch_size=batch_size, **cols)
+            tempos.append(time.perf_counter() - inicio)
+        melhor = min(tempos)
+        print(f"batch={batch_size:>7}  {n:,} linhas em {melhor:.3f}s  ->  {n / melhor / 1e6:.2f} M linhas/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark — Tempo de import e de primeira renderização (cold) das páginas
+Execute: python benchmarks/bench_startup.py
+
+Cada medição roda num processo Python novo, para que nada venha de
+sys.modules ou dos caches do Streamlit. Requer um banco já configurado.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPEAT = 3
+
+MODULES = [
+    "utils.database",
+    "utils.calculations",
+    "utils.bitmap_index",
+    "streamlit",
+    "plotly.graph_objects",
+]
+
+PAGES = ["app.py", "pages/1_visao_geral.py", "pages/2_credito_risco.py"]
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+"""
+
+RENDER_SNIPPET = """
+import time
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({path!r}, default_timeout=120)
+at.run()
+assert not at.exception, [e.value for e in at.exception]
+print(time.perf_counter() - t)
+"""
+
+
+def _run(snippet: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def best_of(snippet: str) -> float:
+    return min(_run(snippet) for _ in range(REPEAT))
+
+
+def main():
+    print("Import (processo novo, melhor de %d):" % REPEAT)
+    for module in MODULES:
+        tempo = best_of(IMPORT_SNIPPET.format(root=ROOT, module=module))
+        print(f"  {module:<24} {tempo * 1000:8.1f} ms")
+
+    print("\nPrimeira renderização cold (AppTest, inclui imports):")
+    for page in PAGES:
+        tempo = best_of(RENDER_SNIPPET.format(path=os.path.join(ROOT, page)))
+        print(f"  {page:<24} {tempo * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Check — Equivalência do modo out-of-core com os cálculos em memória
+Execute: python benchmarks/check_out_of_core.py [chunksize]
+
+Compara cada finalizador de StreamingAggregates com a função de
+utils/calculations (ou scoring/whatif/timeseries) sobre as mesmas linhas,
+para várias combinações de filtros. Um chunksize pequeno força muitos
+folds de parciais. Sai com código 1 se alguma saída divergir.
+"""
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import calculations as calc
+from utils.database import FAIXAS_ETARIAS, get_data_version, query_application_data
+from utils.downsampling import prepare_temporal_evolution
+from utils.out_of_core import aggregate_application_data
+from utils.scoring import calculate_score_distribution
+from utils.timeseries import get_monthly_aggregates
+from utils.whatif import SegmentCube
+
+RTOL = 1e-12
+
+GRANULARITIES = ["auto", "daily", "weekly", "monthly", "quarterly"]
+
+FILTROS = {
+    "year": ["todos", "2024", "2010"],
+    "gender": ["todos", "F"],
+    "contractType": ["todos", "CASH LOANS"],
+    "ageRange": ["todos", FAIXAS_ETARIAS[1]],
+}
+
+
+def iguais(esperado, obtido) -> bool:
+    if isinstance(esperado, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(esperado, obtido, check_exact=False, rtol=RTOL)
+        except AssertionError:
+            return False
+        return True
+    if isinstance(esperado, dict):
+        return esperado.keys() == obtido.keys() and all(iguais(esperado[k], obtido[k]) for k in esperado)
+    if esperado is None or obtido is None:
+        return esperado is obtido
+    if isinstance(esperado, str):
+        return esperado == obtido
+    return bool(np.isclose(esperado, obtido, rtol=RTOL, equal_nan=True))
+
+
+def comparacoes(df: pd.DataFrame, agg) -> dict:
+    """Pares (em memória, out-of-core) por nome de saída."""
+    pares = {
+        "volume": (calc.calculate_volume(df), agg.volume()),
+        "ticket_medio": (calc.calculate_ticket_medio(df), agg.ticket_medio()),
+        "count_contratos": (calc.count_contratos(df), agg.count_contratos()),
+        "taxa_inadimplencia": (calc.calculate_taxa_inadimplencia(df), agg.taxa_inadimplencia()),
+        "taxa_eficiencia": (calc.calculate_taxa_eficiencia(df), agg.taxa_eficiencia()),
+        "age_distribution": (calc.calculate_age_distribution(df), agg.age_distribution()),
+        "group_by_field": (calc.group_by_field(df, "tipo_renda"), agg.group_by_field("tipo_renda")),
+        "risk_heatmap": (calc.generate_risk_heatmap(df), agg.risk_heatmap()),
+        "segment_rates": (calc.calculate_segment_rates(df), agg.segment_rates()),
+        "top_critical_segments": (calc.get_top_critical_segments(df), agg.top_critical_segments()),
+        "score_distribution": (calculate_score_distribution(df), agg.score_distribution()),
+        "prepare_temporal_evolution": (prepare_temporal_evolution(df), agg.prepare_temporal_evolution()),
+    }
+    for granularity in GRANULARITIES:
+        pares[f"temporal_evolution[{granularity}]"] = (
+            calc.calculate_temporal_evolution(df, granularity), agg.temporal_evolution(granularity),
+        )
+
+    esperado, obtido = SegmentCube.from_frame(df), agg.segment_cube()
+    pares["segment_cube"] = (
+        {"labels": esperado.labels, "segments": esperado.segments()},
+        {"labels": obtido.labels, "segments": obtido.segments()},
+    )
+    return pares
+
+
+def main():
+    chunksize = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    version = get_data_version()
+    falhas = []
+
+    for valores in itertools.product(*FILTROS.values()):
+        filters = dict(zip(FILTROS, valores))
+        df = query_application_data(filters)
+        agg = aggregate_application_data(filters, chunksize=chunksize, version=version)
+        for nome, (esperado, obtido) in comparacoes(df, agg).items():
+            if nome == "segment_cube":
+                ok = esperado["labels"] == obtido["labels"] and iguais(esperado["segments"], obtido["segments"])
+            else:
+                ok = iguais(esperado, obtido)
+            if not ok:
+                falhas.append((nome, filters))
+
+    # Cubo mensal (variações MoM/YoY e taxas móveis) sobre a base toda
+    cubo = aggregate_application_data(chunksize=chunksize, version=version).monthly_aggregates()
+    referencia = get_monthly_aggregates(version)
+    for valores in itertools.product(*FILTROS.values()):
+        filters = dict(zip(FILTROS, valores))
+        if not iguais(referencia.compare(filters), cubo.compare(filters)):
+            falhas.append(("period_comparison", filters))
+
+    for nome, filters in falhas:
+        print(f"[FAIL] {nome}: {filters}")
+    total = len(list(itertools.product(*FILTROS.values())))
+    print(f"{total} combinações de filtros, chunksize={chunksize}: {len(falhas)} divergências")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
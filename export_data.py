@@ -0,0 +1,52 @@
+"""
+Export Data — Exporta o recorte filtrado de application_data
+Execute: python export_data.py --year 2023 --format parquet -o recorte.parquet
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.database import CHUNK_SIZE, db_exists
+from utils.export import EXPORT_COLUMNS, EXPORT_FORMATS, export_application_data, export_filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta application_data filtrado em streaming.")
+    parser.add_argument("--year", default="todos", help="Ano (ex.: 2023) ou 'todos'")
+    parser.add_argument("--month", default="todos", help="Mês 1-12 ou 'todos' (requer --year)")
+    parser.add_argument("--gender", default="todos", help="M, F ou 'todos'")
+    parser.add_argument("--contract", default="todos", help="Tipo de contrato ou 'todos'")
+    parser.add_argument("--age", default="todos", help="Faixa etária ou 'todos'")
+    parser.add_argument("--format", default="csv", choices=list(EXPORT_FORMATS))
+    parser.add_argument("--columns", default=",".join(EXPORT_COLUMNS),
+                        help="Colunas separadas por vírgula")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("-o", "--output", help="Arquivo de saída (padrão: application_data.<ext>)")
+    args = parser.parse_args(argv)
+
+    if not db_exists():
+        print("[ERROR] Banco nao encontrado. Execute: python setup_database.py")
+        sys.exit(1)
+
+    filters = {
+        "year": args.year,
+        "month": args.month,
+        "gender": args.gender,
+        "contractType": args.contract,
+        "ageRange": args.age,
+    }
+    output = args.output or export_filename(args.format)
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()]
+
+    print(f"[INFO] Exportando para {output}...")
+    try:
+        linhas = export_application_data(filters, output, args.format, columns, args.chunksize)
+    except (ValueError, ImportError) as exc:
+        print(f"[ERROR] {exc}")
+        sys.exit(1)
+    print(f"[OK] {linhas} registros exportados ({os.path.getsize(output) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,26 +6,38 @@ import plotly.graph_objects as go
 import os
 import sys
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from utils.database import query_application_data
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from utils.assets import load_css
+from utils.database import check_readiness, get_data_version, query_application_sample, sample_exists
 from utils.calculations import (
     calculate_volume,
     calculate_ticket_medio,
     count_contratos,
     calculate_taxa_inadimplencia,
     calculate_taxa_eficiencia,
-    calculate_temporal_evolution,
     calculate_age_distribution,
+    estimate_kpis,
     group_by_field,
 )
+from utils.downsampling import prepare_temporal_evolution
+from utils.bitmap_index import query_indexed
+from utils.out_of_core import aggregate_application_data
+from utils.timeseries import ROLLING_WINDOWS, period_comparison
+from utils.sketches import get_sketch_store
+from utils.figures import cached_figure
+from utils.export import EXPORT_FORMATS, available_formats, export_filename, export_to_bytes
 
 st.set_page_config(page_title="Panorama Executivo", page_icon="📊", layout="wide")
 
-# CSS
-CSS_PATH = os.path.join(os.path.dirname(__file__), "..", "assets", "style.css")
-if os.path.exists(CSS_PATH):
-    with open(CSS_PATH) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# CSS (lido do disco uma vez por processo)
+st.markdown(load_css(), unsafe_allow_html=True)
+
+ready, motivo = check_readiness()
+if not ready:
+    st.error(f"⚠️ {motivo} Execute `python setup_database.py` e recarregue a página.")
+    st.stop()
 
 # Cores e Estilos
 TEAL = "#04BDAC"
@@ -48,97 +60,214 @@ filters = st.session_state.get("filters", {
 })
 
 
-@st.cache_data(ttl=60)
-def load_data(filter_key):
-    """Carrega dados com cache."""
-    return query_application_data(filters)
+def load_data(filters):
+    """Seleciona as linhas via bitmap index (resultado em cache por versão + filtros)."""
+    return query_indexed(filters)
 
 
-df = load_data(str(filters))
+@st.cache_data(show_spinner=False, max_entries=16, ttl=3600)
+def load_aggregates(filter_key, data_version):
+    """Agregados em streaming (modo out-of-core): memória proporcional aos grupos, não às linhas."""
+    return aggregate_application_data(filters, version=data_version)
 
-if df.empty:
-    st.warning("Nenhum dado encontrado para os filtros selecionados.")
-    st.stop()
 
-# --- Cálculos ---
-vol = calculate_volume(df)
-ticket = calculate_ticket_medio(df)
-total = count_contratos(df)
-inadimplencia = calculate_taxa_inadimplencia(df)
-eficiencia = calculate_taxa_eficiencia(df)
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_monthly_aggregates(data_version):
+    """Cubo mensal do modo out-of-core: streaming da base toda, sem o store colunar."""
+    return aggregate_application_data(version=data_version).monthly_aggregates()
 
-# --- HEADER (Oculto visualmente pois o layout é focado nos cards) ---
-# st.title("Panorama Executivo") 
 
-# --- CARDS HTML CORRIGIDOS ---
-def card_html(icon, title, value, badge_text, badge_color="rgba(4, 189, 172, 0.2)"):
+@st.cache_data(ttl=60)
+def load_estimates(filter_key, data_version):
+    """Estimativas dos KPIs sobre a amostra estratificada (custo fixo)."""
+    return estimate_kpis(query_application_sample(filters))
+
+
+def card_html(icon, title, value, badge_text, badge_color="rgba(4, 189, 172, 0.2)", trend=""):
+    trend_html = f'<div class="card-trend">{trend}</div>' if trend else ""
     return f"""
     <div class="custom-card">
         <div>
             <div class="card-icon">{icon}</div>
             <div class="card-title">{title}</div>
             <div class="card-value">{value}</div>
+            {trend_html}
         </div>
         <div class="card-badge">{badge_text}</div>
     </div>
     """
 
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    val_fmt = f"R$ {vol['total_volume']:,.0f}".replace(",", ".")
-    st.markdown(card_html("💵", "VOLUME TOTAL", val_fmt, f"{eficiencia:.1f}%"), unsafe_allow_html=True)
-
-with col2:
-    ticket_fmt = f"R$ {ticket:,.0f}".replace(",", ".")
-    st.markdown(card_html("🏷️", "TICKET MÉDIO", ticket_fmt, "Médio"), unsafe_allow_html=True)
 
-with col3:
-    st.markdown(card_html("📄", "TOTAL DE CONTRATOS", str(total), "Contratos"), unsafe_allow_html=True)
+def fmt_brl(valor):
+    return f"R$ {valor:,.0f}".replace(",", ".")
 
-with col4:
-    inad_fmt = f"{inadimplencia:.2f}%"
-    st.markdown(card_html("⚠️", "TAXA INADIMPLÊNCIA", inad_fmt, "Atenção"), unsafe_allow_html=True)
 
+def fmt_delta(valor, unidade="%"):
+    """Variação com sinal ('—' sem base de comparação)."""
+    if valor is None:
+        return "—"
+    return f"{valor:+.1f}{unidade}"
 
-# --- GRÁFICO PRINCIPAL ---
-st.markdown("""
-<div class="chart-container">
-    <div class="section-title">Qual a evolução do nosso volume estratégico?</div>
-    <div class="section-subtitle">EVOLUÇÃO DO VOLUME AO LONGO DO TEMPO</div>
-</div>
-""", unsafe_allow_html=True)
 
-evo = calculate_temporal_evolution(df)
-
-if not evo.empty:
-    fig_evo = go.Figure()
-
-    # Linha Suave (Spline)
-    fig_evo.add_trace(go.Scatter(
-        x=evo["label"], y=evo["volume"],
+# --- FIGURAS ---
+# Funções puras dos resultados calculados: cached_figure só as executa quando
+# o resultado muda. Séries numéricas vão como arrays NumPy (typed arrays em base64).
+def fig_evolucao(evo):
+    fig = go.Figure(go.Scatter(
+        x=evo["data"].to_numpy(), y=evo["volume"].to_numpy(dtype=float),
+        customdata=evo["label"].tolist(),
+        hovertemplate="%{customdata}: R$ %{y:,.2f}<extra></extra>",
         mode="lines+markers",
         name="Volume",
         line=dict(color="#E0C068", width=2, shape='spline', smoothing=1.3),
         marker=dict(size=6, color="#E0C068", line=dict(width=1, color="#111")),
     ))
-    
-    fig_evo.update_layout(
-        **PLOT_LAYOUT,
+    fig.update_layout(dict(
+        PLOT_LAYOUT,
         height=400,
         hovermode="x unified",
         xaxis=dict(
-            tickfont=dict(color="#666"), 
+            tickfont=dict(color="#666"),
             showgrid=False
         ),
         yaxis=dict(
-            visible=True, 
+            visible=True,
             tickfont=dict(color="#666"),
             tickprefix="R$ "
         ),
         showlegend=False
-    )
-    st.plotly_chart(fig_evo, use_container_width=True)
+    ))
+    return fig
+
+
+def fig_renda(renda):
+    fig = go.Figure(go.Bar(
+        x=renda["value"].to_numpy(dtype=float), y=renda["label"].tolist(), orientation='h',
+        marker=dict(color="#E0C068")
+    ))
+    fig.update_layout(dict(PLOT_LAYOUT, height=250, yaxis=dict(autorange="reversed")))
+    return fig
+
+
+def fig_faixa_etaria(age):
+    fig = go.Figure(go.Pie(
+        labels=age["faixa_etaria"].tolist(), values=age["quantidade"].to_numpy(dtype=float), hole=0.7,
+        marker=dict(colors=["#E0C068", "#C9A55C", "#8B7355", "#5C4D38"])
+    ))
+    fig.update_layout(**PLOT_LAYOUT, height=250, showlegend=False)
+    return fig
+
+
+def fig_renda_hist(hist):
+    fig = go.Figure(go.Bar(
+        x=[f"{fmt_brl(a)} – {fmt_brl(b)}" for a, b in zip(hist["inicio"], hist["fim"])],
+        y=hist["quantidade"].to_numpy(dtype=float),
+        marker=dict(color="#C9A55C"),
+    ))
+    fig.update_layout(dict(
+        PLOT_LAYOUT,
+        height=300,
+        xaxis=dict(tickfont=dict(color="#666"), title=dict(text="Renda total")),
+        yaxis=dict(visible=True, tickfont=dict(color="#666")),
+    ))
+    return fig
+
+
+# --- CARDS ---
+# Placeholders: no modo aproximado mostram as estimativas até o exato chegar
+card_slots = [col.empty() for col in st.columns(4)]
+
+if st.session_state.get("approx_mode") and sample_exists():
+    est = load_estimates(str(filters), get_data_version())
+    aprox = [
+        ("💵", "VOLUME TOTAL", f"≈ {fmt_brl(est['total_volume']['valor'])}",
+         f"± {fmt_brl(est['total_volume']['margem'])}"),
+        ("🏷️", "TICKET MÉDIO", f"≈ {fmt_brl(est['ticket_medio']['valor'])}",
+         f"± {fmt_brl(est['ticket_medio']['margem'])}"),
+        ("📄", "TOTAL DE CONTRATOS", f"≈ {est['total_contratos']['valor']:,.0f}".replace(",", "."),
+         f"± {est['total_contratos']['margem']:,.0f}".replace(",", ".")),
+        ("⚠️", "TAXA INADIMPLÊNCIA", f"≈ {est['taxa_inadimplencia']['valor']:.2f}%",
+         f"± {est['taxa_inadimplencia']['margem']:.2f} p.p."),
+    ]
+    for slot, card in zip(card_slots, aprox):
+        slot.markdown(card_html(*card), unsafe_allow_html=True)
+
+out_of_core = st.session_state.get("out_of_core", False)
+if out_of_core:
+    agg = load_aggregates(str(filters), get_data_version())
+    vazio = agg.n_rows == 0
+else:
+    df = load_data(filters)
+    vazio = df.empty
+
+if vazio:
+    for slot in card_slots:
+        slot.empty()
+    st.warning("Nenhum dado encontrado para os filtros selecionados.")
+    st.stop()
+
+# --- Cálculos ---
+if out_of_core:
+    vol = agg.volume()
+    ticket = agg.ticket_medio()
+    total = agg.count_contratos()
+    inadimplencia = agg.taxa_inadimplencia()
+    eficiencia = agg.taxa_eficiencia()
+else:
+    vol = calculate_volume(df)
+    ticket = calculate_ticket_medio(df)
+    total = count_contratos(df)
+    inadimplencia = calculate_taxa_inadimplencia(df)
+    eficiencia = calculate_taxa_eficiencia(df)
+
+# --- HEADER (Oculto visualmente pois o layout é focado nos cards) ---
+# st.title("Panorama Executivo") 
+
+# Variações e taxas móveis: somas acumuladas do cubo mensal (O(1) por card)
+if out_of_core:
+    comp = load_monthly_aggregates(get_data_version()).compare(filters)
+else:
+    comp = period_comparison(filters)
+deltas = comp["deltas"]
+
+
+def delta(metric, periodo, unidade="%"):
+    rotulo = {"mom": "MoM", "yoy": "YoY"}[periodo]
+    return f"{rotulo} {fmt_delta(deltas[metric][periodo], unidade)}"
+
+
+movel = " · ".join(f"{n}M {comp['taxa_movel'][n]:.1f}%" for n in ROLLING_WINDOWS)
+
+exatos = [
+    ("💵", "VOLUME TOTAL", fmt_brl(vol["total_volume"]), f"{eficiencia:.1f}%",
+     f"{delta('volume', 'mom')} · {delta('volume', 'yoy')}"),
+    ("🏷️", "TICKET MÉDIO", fmt_brl(ticket), delta("ticket_medio", "mom"), delta("ticket_medio", "yoy")),
+    ("📄", "TOTAL DE CONTRATOS", str(total), delta("contratos", "mom"), delta("contratos", "yoy")),
+    ("⚠️", "TAXA INADIMPLÊNCIA", f"{inadimplencia:.2f}%", delta("taxa_inadimplencia", "mom", " p.p."),
+     f"Móvel {movel}"),
+]
+for slot, (icon, title, value, badge, trend) in zip(card_slots, exatos):
+    slot.markdown(card_html(icon, title, value, badge, trend=trend), unsafe_allow_html=True)
+
+st.caption(
+    f"Variações e taxas móveis referentes a {comp['referencia']} "
+    "(mês selecionado, ou o último mês do período)."
+)
+
+
+# --- GRÁFICO PRINCIPAL ---
+st.markdown("""
+<div class="chart-container">
+    <div class="section-title">Qual a evolução do nosso volume estratégico?</div>
+    <div class="section-subtitle">EVOLUÇÃO DO VOLUME AO LONGO DO TEMPO</div>
+</div>
+""", unsafe_allow_html=True)
+
+# Bucketing adaptativo + LTTB: payload do gráfico limitado a MAX_POINTS pontos
+evo = agg.prepare_temporal_evolution() if out_of_core else prepare_temporal_evolution(df)
+
+if not evo.empty:
+    st.plotly_chart(cached_figure("visao_geral.evolucao", fig_evolucao, evo), use_container_width=True)
 else:
     st.info("Sem dados temporais para exibir.")
 
@@ -148,22 +277,52 @@ c_left, c_right = st.columns(2)
 
 with c_left:
     st.markdown('<div class="section-title" style="font-size:1.2rem">Volume por Renda</div>', unsafe_allow_html=True)
-    renda = group_by_field(df, "tipo_renda")
+    renda = agg.group_by_field("tipo_renda") if out_of_core else group_by_field(df, "tipo_renda")
     if not renda.empty:
-        fig_r = go.Figure(go.Bar(
-            x=renda.head(5)["value"], y=renda.head(5)["label"], orientation='h',
-            marker=dict(color="#E0C068")
-        ))
-        fig_r.update_layout(**PLOT_LAYOUT, height=250, yaxis=dict(autorange="reversed"))
-        st.plotly_chart(fig_r, use_container_width=True)
+        st.plotly_chart(cached_figure("visao_geral.renda", fig_renda, renda.head(5)), use_container_width=True)
 
 with c_right:
     st.markdown('<div class="section-title" style="font-size:1.2rem">Faixa Etária</div>', unsafe_allow_html=True)
-    age = calculate_age_distribution(df)
+    age = agg.age_distribution() if out_of_core else calculate_age_distribution(df)
     if not age.empty:
-        fig_p = go.Figure(go.Pie(
-            labels=age["faixa_etaria"], values=age["quantidade"], hole=0.7,
-            marker=dict(colors=["#E0C068", "#C9A55C", "#8B7355", "#5C4D38"])
-        ))
-        fig_p.update_layout(**PLOT_LAYOUT, height=250, showlegend=False)
-        st.plotly_chart(fig_p, use_container_width=True)
+        st.plotly_chart(cached_figure("visao_geral.faixa_etaria", fig_faixa_etaria, age), use_container_width=True)
+
+
+# --- DISTRIBUIÇÃO (sketches de quantis mesclados por célula) ---
+sketches = get_sketch_store()
+if sketches is not None:
+    st.markdown("""
+    <div class="chart-container">
+        <div class="section-title">Como se distribuem crédito e renda?</div>
+        <div class="section-subtitle">QUANTIS POR SEGMENTO E PERÍODO (ERRO RELATIVO ≤ 1%)</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    credito = sketches.quantiles("valor_credito", filters)
+    renda_q = sketches.quantiles("renda_total", filters, [0.5])
+    quantis = [
+        ("🎯", "TICKET MEDIANO", fmt_brl(credito[0.5]), f"Média {fmt_brl(ticket)}"),
+        ("📈", "CRÉDITO P90", fmt_brl(credito[0.9]), "P90"),
+        ("🚩", "CRÉDITO P99", fmt_brl(credito[0.99]), "P99"),
+        ("👛", "RENDA MEDIANA", fmt_brl(renda_q[0.5]), "Renda"),
+    ]
+    for col, card in zip(st.columns(4), quantis):
+        col.markdown(card_html(*card), unsafe_allow_html=True)
+
+    hist = sketches.merged("renda_total", filters).histogram()
+    if not hist.empty:
+        st.plotly_chart(cached_figure("visao_geral.renda_hist", fig_renda_hist, hist), use_container_width=True)
+
+
+# --- EXPORTAÇÃO ---
+with st.expander("⬇️ Exportar recorte filtrado"):
+    export_fmt = st.selectbox("Formato", available_formats(), format_func=str.upper, key="export_fmt")
+    if st.button("Gerar arquivo", key="export_build"):
+        with st.spinner("Exportando em streaming..."):
+            payload, linhas = export_to_bytes(filters, export_fmt)
+        st.download_button(
+            f"Baixar {linhas:,} registros".replace(",", "."),
+            data=payload,
+            file_name=export_filename(export_fmt),
+            mime=EXPORT_FORMATS[export_fmt][1],
+        )
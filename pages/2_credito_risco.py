@@ -3,27 +3,39 @@ Página 2 — Saúde e Risco (Crédito & Risco)
 """
 import streamlit as st
 import plotly.graph_objects as go
-import plotly.express as px
 import os
 import sys
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from utils.database import query_application_data, query_all_application_data
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from utils.assets import load_css
+from utils.bitmap_index import query_indexed
 from utils.calculations import (
     calculate_taxa_inadimplencia,
     calculate_age_distribution,
     generate_risk_heatmap,
     get_top_critical_segments,
     count_contratos,
+    calculate_risk_badges,
 )
+from utils.database import check_readiness, get_data_version
+from utils.figures import cached_figure
+from utils.lazy import DeferredCache
+from utils.out_of_core import aggregate_application_data
+from utils.scoring import calculate_score_distribution
+from utils.whatif import SEGMENT_DIMENSIONS, SegmentCube
+from utils.export import EXPORT_FORMATS, available_formats, export_filename, export_to_bytes
 
 st.set_page_config(page_title="Saúde e Risco", page_icon="⚠️", layout="wide")
 
-# CSS
-CSS_PATH = os.path.join(os.path.dirname(__file__), "..", "assets", "style.css")
-if os.path.exists(CSS_PATH):
-    with open(CSS_PATH) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# CSS (lido do disco uma vez por processo)
+st.markdown(load_css(), unsafe_allow_html=True)
+
+ready, motivo = check_readiness()
+if not ready:
+    st.error(f"⚠️ {motivo} Execute `python setup_database.py` e recarregue a página.")
+    st.stop()
 
 PLOT_LAYOUT = dict(
     paper_bgcolor="rgba(0,0,0,0)",
@@ -33,7 +45,11 @@ PLOT_LAYOUT = dict(
 )
 
 GOLD = "#C9A55C"
-META = 8.0  # Meta de inadimplência
+META = 8.0  # Meta de inadimplência padrão
+
+meta = st.sidebar.number_input(
+    "🎯 Meta de inadimplência (%)", min_value=0.5, max_value=15.0, value=META, step=0.5, key="meta_inadimplencia",
+)
 
 # Pegar filtros
 filters = st.session_state.get("filters", {
@@ -42,20 +58,144 @@ filters = st.session_state.get("filters", {
 })
 
 
-@st.cache_data(ttl=60)
-def load_data(filter_key):
-    return query_application_data(filters)
+def load_data(filters):
+    """Seleciona as linhas via bitmap index (resultado em cache por versão + filtros)."""
+    return query_indexed(filters)
+
+
+@st.cache_data(show_spinner=False, max_entries=16, ttl=3600)
+def load_aggregates(filter_key, data_version):
+    """Agregados em streaming (modo out-of-core): memória proporcional aos grupos, não às linhas."""
+    return aggregate_application_data(filters, version=data_version)
+
+
+@st.cache_data(show_spinner=False)
+def load_risk_badges(data_version):
+    """Taxa global e badges de risco relativo por segmento (cache por versão dos dados)."""
+    agg = aggregate_application_data(version=data_version)
+    taxa_global = agg.taxa_inadimplencia()
+    return taxa_global, calculate_risk_badges(agg.segment_rates(), taxa_global)
+
+
+# --- FIGURAS ---
+# Funções puras dos resultados calculados: cached_figure só as executa quando
+# o resultado muda. Séries numéricas vão como arrays NumPy (typed arrays em base64)
+# e os rótulos de texto saem de texttemplate, não de listas montadas em Python.
+def fig_gauge(inadimplencia, meta):
+    zona_verde = min(5, meta)
+    if inadimplencia <= zona_verde:
+        gauge_color = "#22C55E"
+    elif inadimplencia <= meta:
+        gauge_color = "#EAB308"
+    else:
+        gauge_color = "#EF4444"
+
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number+delta",
+        value=inadimplencia,
+        number=dict(suffix="%", font=dict(size=36, color="white")),
+        delta=dict(reference=meta, suffix="%", decreasing=dict(color="#22C55E"), increasing=dict(color="#EF4444")),
+        gauge=dict(
+            axis=dict(range=[0, 15], tickfont=dict(color="#666"), dtick=3),
+            bar=dict(color=gauge_color),
+            bgcolor="rgba(201,165,92,0.05)",
+            bordercolor="rgba(201,165,92,0.2)",
+            steps=[
+                dict(range=[0, zona_verde], color="rgba(34,197,94,0.1)"),
+                dict(range=[zona_verde, meta], color="rgba(234,179,8,0.1)"),
+                dict(range=[meta, 15], color="rgba(239,68,68,0.1)"),
+            ],
+            threshold=dict(line=dict(color=GOLD, width=3), thickness=0.8, value=meta),
+        ),
+    ))
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#999"),
+        height=280, margin=dict(l=30, r=30, t=30, b=10),
+    )
+    return fig
+
+
+def fig_heatmap(heatmap_data):
+    fig = go.Figure(go.Heatmap(
+        z=heatmap_data.to_numpy(dtype=float),
+        x=heatmap_data.columns.tolist(),
+        y=heatmap_data.index.tolist(),
+        colorscale=[
+            [0, "rgba(34,197,94,0.3)"],
+            [0.5, "rgba(234,179,8,0.5)"],
+            [1, "rgba(239,68,68,0.8)"],
+        ],
+        texttemplate="%{z:.1f}%",
+        textfont=dict(size=10, color="white"),
+        hovertemplate="Escolaridade: %{y}<br>Renda: %{x}<br>Inadimplência: %{z:.1f}%<extra></extra>",
+        colorbar=dict(title=dict(text="Taxa %", font=dict(color=GOLD)), tickfont=dict(color="#999")),
+    ))
+    fig.update_layout(
+        **PLOT_LAYOUT, height=380,
+        xaxis=dict(tickfont=dict(size=9, color="#999"), tickangle=-45),
+        yaxis=dict(tickfont=dict(size=10, color="#999")),
+    )
+    return fig
+
+
+def fig_faixa_etaria(age_risk):
+    fig = go.Figure(go.Bar(
+        x=age_risk["taxa_inadimplencia"].to_numpy(dtype=float),
+        y=age_risk["faixa_etaria"].tolist(),
+        orientation="h",
+        marker=dict(color="#EF4444", line=dict(width=0)),
+        texttemplate="%{x:.1f}%",
+        textposition="outside",
+        textfont=dict(color="#EF4444", size=11),
+    ))
+    fig.update_layout(
+        **PLOT_LAYOUT, height=300, showlegend=False,
+        yaxis=dict(autorange="reversed", categoryorder="array",
+                   categoryarray=age_risk["faixa_etaria"].tolist()),
+        xaxis=dict(title="Taxa de Inadimplência (%)"),
+    )
+    return fig
+
+
+def fig_score(bands):
+    fig = go.Figure(go.Bar(
+        x=bands["faixa"].tolist(),
+        y=bands["quantidade"].to_numpy(dtype=float),
+        marker=dict(color=["#22C55E", "#84CC16", "#EAB308", "#F97316", "#EF4444"], line=dict(width=0)),
+        customdata=bands[["percentual", "taxa_inadimplencia"]].to_numpy(dtype=float),
+        texttemplate="%{customdata[0]:.1f}% | inad. %{customdata[1]:.1f}%",
+        textposition="outside",
+        textfont=dict(color="#999", size=11),
+        hovertemplate="Faixa %{x}<br>Contratos: %{y}<extra></extra>",
+    ))
+    fig.update_layout(
+        **PLOT_LAYOUT, height=320, showlegend=False,
+        yaxis=dict(title="Contratos", tickfont=dict(color="#999")),
+        xaxis=dict(tickfont=dict(color="#999")),
+    )
+    return fig
 
 
-df = load_data(str(filters))
+out_of_core = st.session_state.get("out_of_core", False)
+if out_of_core:
+    agg = load_aggregates(str(filters), get_data_version())
+    vazio = agg.n_rows == 0
+else:
+    df = load_data(filters)
+    vazio = df.empty
 
-if df.empty:
+if vazio:
     st.warning("Nenhum dado encontrado para os filtros selecionados.")
     st.stop()
 
-inadimplencia = calculate_taxa_inadimplencia(df)
-total_contratos = count_contratos(df)
-inadimplentes = int((df["alvo_inadimplencia"] == 1).sum()) if "alvo_inadimplencia" in df.columns else 0
+if out_of_core:
+    inadimplencia = agg.taxa_inadimplencia()
+    total_contratos = agg.count_contratos()
+    inadimplentes = agg.inadimplentes()
+else:
+    inadimplencia = calculate_taxa_inadimplencia(df)
+    total_contratos = count_contratos(df)
+    inadimplentes = int((df["alvo_inadimplencia"] == 1).sum()) if "alvo_inadimplencia" in df.columns else 0
 
 # --- HEADER ---
 st.markdown("""
@@ -83,37 +223,8 @@ with col_gauge:
     </div>
     """, unsafe_allow_html=True)
 
-    # Gauge Chart
-    if inadimplencia <= 5:
-        gauge_color = "#22C55E"
-    elif inadimplencia <= 8:
-        gauge_color = "#EAB308"
-    else:
-        gauge_color = "#EF4444"
-
-    fig_gauge = go.Figure(go.Indicator(
-        mode="gauge+number+delta",
-        value=inadimplencia,
-        number=dict(suffix="%", font=dict(size=36, color="white")),
-        delta=dict(reference=META, suffix="%", decreasing=dict(color="#22C55E"), increasing=dict(color="#EF4444")),
-        gauge=dict(
-            axis=dict(range=[0, 15], tickfont=dict(color="#666"), dtick=3),
-            bar=dict(color=gauge_color),
-            bgcolor="rgba(201,165,92,0.05)",
-            bordercolor="rgba(201,165,92,0.2)",
-            steps=[
-                dict(range=[0, 5], color="rgba(34,197,94,0.1)"),
-                dict(range=[5, 8], color="rgba(234,179,8,0.1)"),
-                dict(range=[8, 15], color="rgba(239,68,68,0.1)"),
-            ],
-            threshold=dict(line=dict(color=GOLD, width=3), thickness=0.8, value=META),
-        ),
-    ))
-    fig_gauge.update_layout(
-        paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#999"),
-        height=280, margin=dict(l=30, r=30, t=30, b=10),
-    )
-    st.plotly_chart(fig_gauge, use_container_width=True)
+    # Gauge Chart (faixa verde até 5% ou até a meta, se ela for menor)
+    st.plotly_chart(cached_figure("credito_risco.gauge", fig_gauge, inadimplencia, meta), use_container_width=True)
 
     # Stats
     st.markdown(f"""
@@ -141,166 +252,250 @@ with col_badges:
     </div>
     """, unsafe_allow_html=True)
 
-    b1, b2 = st.columns(2)
-    with b1:
-        st.markdown("""
-        <div style="background: linear-gradient(to right, rgba(34,197,94,0.08), transparent);
-                    border: 1px solid rgba(34,197,94,0.25); border-radius: 12px; padding: 1rem; margin-bottom: 0.8rem;">
-            <p style="color: #999; font-size: 0.65rem; text-transform: uppercase; margin: 0;">Risco Baixo</p>
-            <p style="color: #22C55E; font-size: 1.1rem; font-weight: bold; margin: 0.2rem 0;">Superior Assalariado</p>
-            <p style="color: #666; font-size: 0.7rem; margin: 0;">Taxa: 2.1% | Volume Seguro</p>
+    # Agregados globais por segmento: uma vez por versão dos dados
+    taxa_global, badges = load_risk_badges(get_data_version())
+
+    def badge_html(nivel, titulo, rgb, cor, acao, margin="0.8rem"):
+        badge = badges.get(nivel)
+        if not badge:
+            nome, detalhe = "—", "Sem dados"
+        else:
+            nome = badge["segmento"]
+            detalhe = (f"Taxa: {badge['taxa_inadimplencia']:.1f}% | "
+                       f"{badge['risco_relativo']:.2f}× global | {acao}")
+        return f"""
+        <div style="background: linear-gradient(to right, rgba({rgb},0.08), transparent);
+                    border: 1px solid rgba({rgb},0.25); border-radius: 12px; padding: 1rem; margin-bottom: {margin};">
+            <p style="color: #999; font-size: 0.65rem; text-transform: uppercase; margin: 0;">{titulo}</p>
+            <p style="color: {cor}; font-size: 1.1rem; font-weight: bold; margin: 0.2rem 0;">{nome}</p>
+            <p style="color: #666; font-size: 0.7rem; margin: 0;">{detalhe}</p>
         </div>
-        """, unsafe_allow_html=True)
+        """
 
-        st.markdown(f"""
-        <div style="background: linear-gradient(to right, rgba(239,68,68,0.08), transparent);
-                    border: 1px solid rgba(239,68,68,0.25); border-radius: 12px; padding: 1rem;">
-            <p style="color: #999; font-size: 0.65rem; text-transform: uppercase; margin: 0;">Risco Alto</p>
-            <p style="color: #EF4444; font-size: 1.1rem; font-weight: bold; margin: 0.2rem 0;">Fundamental Empresário</p>
-            <p style="color: #666; font-size: 0.7rem; margin: 0;">Taxa: 12.5% | Ação Imediata</p>
-        </div>
-        """, unsafe_allow_html=True)
+    b1, b2 = st.columns(2)
+    with b1:
+        st.markdown(badge_html("baixo", "Risco Baixo", "34,197,94", "#22C55E", "Volume Seguro"), unsafe_allow_html=True)
+        st.markdown(badge_html("alto", "Risco Alto", "239,68,68", "#EF4444", "Ação Imediata", margin="0"), unsafe_allow_html=True)
 
     with b2:
-        st.markdown("""
-        <div style="background: linear-gradient(to right, rgba(234,179,8,0.08), transparent);
-                    border: 1px solid rgba(234,179,8,0.25); border-radius: 12px; padding: 1rem; margin-bottom: 0.8rem;">
-            <p style="color: #999; font-size: 0.65rem; text-transform: uppercase; margin: 0;">Risco Médio</p>
-            <p style="color: #EAB308; font-size: 1.1rem; font-weight: bold; margin: 0.2rem 0;">Médio Autônomo</p>
-            <p style="color: #666; font-size: 0.7rem; margin: 0;">Taxa: 6.1% | Monitoramento</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(badge_html("medio", "Risco Médio", "234,179,8", "#EAB308", "Monitoramento"), unsafe_allow_html=True)
 
         st.markdown(f"""
         <div style="background: linear-gradient(to right, rgba(201,165,92,0.08), transparent);
                     border: 1px solid rgba(201,165,92,0.25); border-radius: 12px; padding: 1rem;">
             <p style="color: #999; font-size: 0.65rem; text-transform: uppercase; margin: 0;">Meta Global</p>
-            <p style="color: #C9A55C; font-size: 1.1rem; font-weight: bold; margin: 0.2rem 0;">{META}% Inadimplência</p>
-            <p style="color: #666; font-size: 0.7rem; margin: 0;">Objetivo: Abaixo de {META}% em todos segmentos</p>
+            <p style="color: #C9A55C; font-size: 1.1rem; font-weight: bold; margin: 0.2rem 0;">{meta:.1f}% Inadimplência</p>
+            <p style="color: #666; font-size: 0.7rem; margin: 0;">Carteira total: {taxa_global:.1f}% | Objetivo: abaixo de {meta:.1f}%</p>
         </div>
         """, unsafe_allow_html=True)
 
 st.markdown("---")
 
-# --- HEATMAP ---
-st.markdown("""
-<div style="margin-bottom: 1rem;">
-    <h2 style="font-family: 'Playfair Display', serif; font-size: 1.5rem; color: white; margin: 0;">
-        Onde está concentrado o risco?
-    </h2>
-    <p style="color: rgba(201,165,92,0.5); font-size: 0.65rem; text-transform: uppercase; 
-              letter-spacing: 0.12em; font-weight: 600;">
-        Matriz de Calor: Escolaridade × Tipo de Renda
-    </p>
-</div>
-""", unsafe_allow_html=True)
+# --- ANÁLISE DETALHADA (abaixo da dobra) ---
+# Cada gráfico é um cálculo adiado: só roda quando a seção é exibida e
+# fica memoizado por versão dos dados + assinatura de filtros entre reruns.
+deferred = DeferredCache(st.session_state, signature=f"{get_data_version()}|{filters}")
+if out_of_core:
+    # Finalizadores dos agregados: mesmas saídas, sem os contratos em memória
+    heatmap_handle = deferred.defer("heatmap", agg.risk_heatmap)
+    segments_handle = deferred.defer("segments", agg.top_critical_segments)
+    age_risk_handle = deferred.defer("age_risk", agg.age_distribution)
+    score_handle = deferred.defer("score_bands", agg.score_distribution)
+    cube_handle = deferred.defer("segment_cube", agg.segment_cube)
+else:
+    heatmap_handle = deferred.defer("heatmap", generate_risk_heatmap, df)
+    segments_handle = deferred.defer("segments", get_top_critical_segments, df)
+    age_risk_handle = deferred.defer("age_risk", calculate_age_distribution, df)
+    score_handle = deferred.defer("score_bands", calculate_score_distribution, df)
+    cube_handle = deferred.defer("segment_cube", SegmentCube.from_frame, df)
 
-heatmap_data = generate_risk_heatmap(df)
 
-if not heatmap_data.empty:
-    fig_heat = go.Figure(go.Heatmap(
-        z=heatmap_data.values,
-        x=heatmap_data.columns.tolist(),
-        y=heatmap_data.index.tolist(),
-        colorscale=[
-            [0, "rgba(34,197,94,0.3)"],
-            [0.5, "rgba(234,179,8,0.5)"],
-            [1, "rgba(239,68,68,0.8)"],
-        ],
-        text=[[f"{v:.1f}%" for v in row] for row in heatmap_data.values],
-        texttemplate="%{text}",
-        textfont=dict(size=10, color="white"),
-        hovertemplate="Escolaridade: %{y}<br>Renda: %{x}<br>Inadimplência: %{z:.1f}%<extra></extra>",
-        colorbar=dict(title="Taxa %", tickfont=dict(color="#999"), titlefont=dict(color=GOLD)),
-    ))
-    fig_heat.update_layout(
-        **PLOT_LAYOUT, height=380,
-        xaxis=dict(tickfont=dict(size=9, color="#999"), tickangle=-45),
-        yaxis=dict(tickfont=dict(size=10, color="#999")),
-    )
-    st.plotly_chart(fig_heat, use_container_width=True)
-else:
-    st.info("Sem dados para o heatmap.")
+def render_heatmap():
+    st.markdown("""
+    <div style="margin-bottom: 1rem;">
+        <h2 style="font-family: 'Playfair Display', serif; font-size: 1.5rem; color: white; margin: 0;">
+            Onde está concentrado o risco?
+        </h2>
+        <p style="color: rgba(201,165,92,0.5); font-size: 0.65rem; text-transform: uppercase; 
+                  letter-spacing: 0.12em; font-weight: 600;">
+            Matriz de Calor: Escolaridade × Tipo de Renda
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
 
-st.markdown("---")
+    heatmap_data = heatmap_handle.get()
 
-# --- BOTTOM ROW ---
-col_seg, col_age = st.columns(2)
+    if not heatmap_data.empty:
+        st.plotly_chart(cached_figure("credito_risco.heatmap", fig_heatmap, heatmap_data), use_container_width=True)
+    else:
+        st.info("Sem dados para o heatmap.")
 
-with col_seg:
+
+def render_segmentos_idade():
+    col_seg, col_age = st.columns(2)
+
+    with col_seg:
+        st.markdown("""
+        <div style="margin-bottom: 1rem;">
+            <h2 style="font-family: 'Playfair Display', serif; font-size: 1.3rem; color: white; margin: 0;">
+                Quais segmentos exigem atenção?
+            </h2>
+            <p style="color: rgba(201,165,92,0.5); font-size: 0.65rem; text-transform: uppercase; 
+                      letter-spacing: 0.12em; font-weight: 600;">
+                Top 5 Segmentos Mais Críticos
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+        segments = segments_handle.get()
+        if not segments.empty:
+            for idx, row in segments.iterrows():
+                taxa = row["taxa_inadimplencia"]
+                if taxa >= 10:
+                    color = "#EF4444"
+                elif taxa >= 7:
+                    color = "#EAB308"
+                else:
+                    color = "#22C55E"
+
+                rank = segments.index.get_loc(idx) + 1
+                st.markdown(f"""
+                <div style="background: rgba(0,0,0,0.3); border: 1px solid rgba(201,165,92,0.1);
+                            border-radius: 10px; padding: 0.8rem 1rem; margin-bottom: 0.5rem;">
+                    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.3rem;">
+                        <div style="display: flex; align-items: center; gap: 0.5rem;">
+                            <span style="font-size: 1.2rem; font-weight: 900; color: rgba(201,165,92,0.3);">#{rank}</span>
+                            <span style="font-size: 0.8rem; font-weight: bold; color: white;">{row['segmento']}</span>
+                        </div>
+                        <span style="font-size: 1rem; font-weight: 900; color: {color};">{taxa:.2f}%</span>
+                    </div>
+                    <div style="display: flex; gap: 1rem; font-size: 0.7rem; color: #666;">
+                        <span>Contratos: {int(row['qtd_contratos']):,}</span>
+                        <span>Volume: R$ {row['volume_exposto']/1000:.0f}k</span>
+                    </div>
+                </div>
+                """.replace(",", "."), unsafe_allow_html=True)
+        else:
+            st.info("Sem dados de segmentos críticos.")
+
+    with col_age:
+        st.markdown("""
+        <div style="margin-bottom: 1rem;">
+            <h2 style="font-family: 'Playfair Display', serif; font-size: 1.3rem; color: white; margin: 0;">
+                Como a idade influencia?
+            </h2>
+            <p style="color: rgba(201,165,92,0.5); font-size: 0.65rem; text-transform: uppercase; 
+                      letter-spacing: 0.12em; font-weight: 600;">
+                Taxa de Inadimplência por Faixa Etária
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+        age_risk = age_risk_handle.get()
+        if not age_risk.empty:
+            st.plotly_chart(cached_figure("credito_risco.faixa_etaria", fig_faixa_etaria, age_risk), use_container_width=True)
+        else:
+            st.info("Sem dados por faixa etária.")
+
+
+def render_score():
     st.markdown("""
     <div style="margin-bottom: 1rem;">
         <h2 style="font-family: 'Playfair Display', serif; font-size: 1.3rem; color: white; margin: 0;">
-            Quais segmentos exigem atenção?
+            Como a carteira se distribui no score?
         </h2>
         <p style="color: rgba(201,165,92,0.5); font-size: 0.65rem; text-transform: uppercase; 
                   letter-spacing: 0.12em; font-weight: 600;">
-            Top 5 Segmentos Mais Críticos
+            Contratos por Faixa de Score de Risco (A = menor risco)
         </p>
     </div>
     """, unsafe_allow_html=True)
 
-    segments = get_top_critical_segments(df)
-    if not segments.empty:
-        for idx, row in segments.iterrows():
-            taxa = row["taxa_inadimplencia"]
-            if taxa >= 10:
-                color = "#EF4444"
-            elif taxa >= 7:
-                color = "#EAB308"
-            else:
-                color = "#22C55E"
-
-            rank = segments.index.get_loc(idx) + 1
-            st.markdown(f"""
-            <div style="background: rgba(0,0,0,0.3); border: 1px solid rgba(201,165,92,0.1);
-                        border-radius: 10px; padding: 0.8rem 1rem; margin-bottom: 0.5rem;">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.3rem;">
-                    <div style="display: flex; align-items: center; gap: 0.5rem;">
-                        <span style="font-size: 1.2rem; font-weight: 900; color: rgba(201,165,92,0.3);">#{rank}</span>
-                        <span style="font-size: 0.8rem; font-weight: bold; color: white;">{row['segmento']}</span>
-                    </div>
-                    <span style="font-size: 1rem; font-weight: 900; color: {color};">{taxa:.2f}%</span>
-                </div>
-                <div style="display: flex; gap: 1rem; font-size: 0.7rem; color: #666;">
-                    <span>Contratos: {int(row['qtd_contratos']):,}</span>
-                    <span>Volume: R$ {row['volume_exposto']/1000:.0f}k</span>
-                </div>
-            </div>
-            """.replace(",", "."), unsafe_allow_html=True)
+    bands = score_handle.get()
+    if not bands.empty:
+        st.plotly_chart(cached_figure("credito_risco.score", fig_score, bands), use_container_width=True)
     else:
-        st.info("Sem dados de segmentos críticos.")
+        st.info("Score de risco indisponível. Execute setup_database.py para gerá-lo.")
 
-with col_age:
+
+def render_whatif():
     st.markdown("""
     <div style="margin-bottom: 1rem;">
         <h2 style="font-family: 'Playfair Display', serif; font-size: 1.3rem; color: white; margin: 0;">
-            Como a idade influencia?
+            E se cortarmos segmentos?
         </h2>
         <p style="color: rgba(201,165,92,0.5); font-size: 0.65rem; text-transform: uppercase; 
                   letter-spacing: 0.12em; font-weight: 600;">
-            Taxa de Inadimplência por Faixa Etária
+            Simulação: Escolaridade × Tipo de Renda × Faixa Etária
         </p>
     </div>
     """, unsafe_allow_html=True)
 
-    age_risk = calculate_age_distribution(df)
-    if not age_risk.empty:
-        fig_age = go.Figure(go.Bar(
-            x=age_risk["taxa_inadimplencia"],
-            y=age_risk["faixa_etaria"],
-            orientation="h",
-            marker=dict(color="#EF4444", line=dict(width=0)),
-            text=[f"{v:.1f}%" for v in age_risk["taxa_inadimplencia"]],
-            textposition="outside",
-            textfont=dict(color="#EF4444", size=11),
-        ))
-        fig_age.update_layout(
-            **PLOT_LAYOUT, height=300, showlegend=False,
-            yaxis=dict(autorange="reversed", categoryorder="array",
-                       categoryarray=age_risk["faixa_etaria"].tolist()),
-            xaxis=dict(title="Taxa de Inadimplência (%)"),
+    cube = cube_handle.get()
+    if cube.contratos.sum() == 0:
+        st.info("Sem dados para simular.")
+        return
+
+    nomes = {"escolaridade": "Escolaridade", "tipo_renda": "Tipo de Renda", "faixa_etaria": "Faixa Etária"}
+    cols = st.columns(len(SEGMENT_DIMENSIONS))
+    excluded_values = [
+        col.multiselect(f"Cortar {nomes[dim]}", cube.labels[i], key=f"whatif_{dim}")
+        for i, (col, dim) in enumerate(zip(cols, SEGMENT_DIMENSIONS))
+    ]
+
+    segs = cube.segments().sort_values("taxa_inadimplencia", ascending=False)
+    dims = [f"dim_{i}" for i in range(len(SEGMENT_DIMENSIONS))]
+    celulas = dict(zip(segs["segmento"], segs[dims].itertuples(index=False, name=None)))
+    taxas = dict(zip(segs["segmento"], segs["taxa_inadimplencia"]))
+    escolhidos = st.multiselect(
+        "Cortar segmentos específicos (ordenados pela taxa)", list(celulas), key="whatif_cells",
+        format_func=lambda s: f"{s} — {taxas[s]:.1f}%",
+    )
+
+    sim = cube.simulate(excluded_values, [celulas[s] for s in escolhidos])
+    status = "#22C55E" if sim["taxa_inadimplencia"] <= meta else "#EF4444"
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Taxa simulada", f"{sim['taxa_inadimplencia']:.2f}%", f"{sim['delta_taxa']:+.2f} p.p.", delta_color="inverse")
+    m2.metric("Contratos mantidos", f"{sim['contratos']:,}".replace(",", "."), f"-{sim['contratos_cortados']:,}".replace(",", "."), delta_color="off")
+    m3.metric("Volume mantido", f"R$ {sim['volume']/1e6:,.1f}M", f"-R$ {sim['volume_cortado']/1e6:,.1f}M", delta_color="off")
+
+    st.markdown(f"""
+    <p style="color: {status}; font-size: 0.8rem; font-weight: bold;">
+        {"Dentro" if sim["taxa_inadimplencia"] <= meta else "Acima"} da meta de {meta:.1f}%
+    </p>
+    """, unsafe_allow_html=True)
+
+
+# Fragmento: trocar de seção reexecuta só este bloco, não a página inteira
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+SECOES = {
+    "Matriz de Calor": render_heatmap,
+    "Segmentos e Faixa Etária": render_segmentos_idade,
+    "Score de Risco": render_score,
+    "Simulação What-if": render_whatif,
+}
+
+
+@_fragment
+def render_analise_detalhada():
+    secao = st.radio("Análise detalhada", list(SECOES), horizontal=True, label_visibility="collapsed")
+    SECOES[secao]()
+
+
+render_analise_detalhada()
+
+
+# --- EXPORTAÇÃO ---
+with st.expander("⬇️ Exportar recorte filtrado"):
+    export_fmt = st.selectbox("Formato", available_formats(), format_func=str.upper, key="export_fmt")
+    if st.button("Gerar arquivo", key="export_build"):
+        with st.spinner("Exportando em streaming..."):
+            payload, linhas = export_to_bytes(filters, export_fmt)
+        st.download_button(
+            f"Baixar {linhas:,} registros".replace(",", "."),
+            data=payload,
+            file_name=export_filename(export_fmt),
+            mime=EXPORT_FORMATS[export_fmt][1],
         )
-        st.plotly_chart(fig_age, use_container_width=True)
-    else:
-        st.info("Sem dados por faixa etária.")
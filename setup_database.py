@@ -7,14 +7,67 @@ import pandas as pd
 import os
 import sys
 
-# Paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-DB_PATH = os.path.join(DATA_DIR, "credito.db")
+from utils.database import DATA_DIR, new_db_version, publish_db_version
+from utils.scoring import SCORE_COLUMN, score_dataframe
+from utils.shared_store import build_store
+from utils.sketches import SKETCH_TABLE, build_sketches
+from utils.validation import APPLICATION_SCHEMA, PREVIOUS_SCHEMA, validate_chunks
 
 CSV_APPLICATION = os.path.join(DATA_DIR, "application_data_ptbr.csv")
 CSV_PREVIOUS = os.path.join(DATA_DIR, "previous_application_ptbr.csv")
 
+# Amostra estratificada para o modo aproximado
+SAMPLE_SIZE = 20000
+SAMPLE_STRATA = ["alvo_inadimplencia", "tipo_contrato"]
+SAMPLE_MIN_PER_STRATUM = 200
+SAMPLE_SEED = 42
+
+# Linhas por chunk na leitura + validação dos CSVs
+INGEST_CHUNK_SIZE = 100_000
+
+
+def build_stratified_sample(df_app: pd.DataFrame, size: int = SAMPLE_SIZE) -> pd.DataFrame:
+    """
+    Amostra estratificada de tamanho fixo (alocação proporcional, com mínimo
+    por estrato). Guarda o tamanho do estrato na população (pop_estrato) e na
+    amostra (n_estrato) para as estimativas com intervalo de confiança.
+    """
+    total = len(df_app)
+    strata = df_app[SAMPLE_STRATA].astype(str).agg("|".join, axis=1)
+
+    partes = []
+    for estrato, idx in strata.groupby(strata).groups.items():
+        pop = len(idx)
+        n = max(SAMPLE_MIN_PER_STRATUM, round(size * pop / total))
+        n = min(n, pop)
+        parte = df_app.loc[idx].sample(n=n, random_state=SAMPLE_SEED)
+        partes.append(parte.assign(estrato=estrato, pop_estrato=pop, n_estrato=n))
+
+    return pd.concat(partes, ignore_index=True)
+
+
+def read_validated(csv_path: str, col_map: dict, schema: dict, nome: str) -> tuple:
+    """
+    Lê o CSV em chunks, renomeia e valida cada chunk. Retorna (válidas, quarentena).
+    Sai com erro se faltar coluna obrigatória.
+    """
+    chunks = (
+        chunk.rename(columns={k: v for k, v in col_map.items() if k in chunk.columns})
+        for chunk in pd.read_csv(csv_path, chunksize=INGEST_CHUNK_SIZE)
+    )
+    try:
+        df_ok, df_bad, counts = validate_chunks(chunks, schema)
+    except ValueError as exc:
+        print(f"[ERROR] {nome}: {exc}")
+        sys.exit(1)
+
+    if counts:
+        print(f"  [WARN] {nome}: {len(df_bad)} registros em quarentena")
+        for motivo, linhas in sorted(counts.items(), key=lambda item: -item[1]):
+            print(f"         - {motivo}: {linhas}")
+    # Cópia profunda consolida os blocos (o read_csv gera um bloco por coluna)
+    return df_ok.copy(), df_bad
+
 
 def create_database():
     """Cria o banco SQLite e importa os CSVs."""
@@ -29,8 +82,6 @@ def create_database():
     print("[INFO] Lendo CSVs...")
 
     # --- application_data ---
-    df_app = pd.read_csv(CSV_APPLICATION)
-
     # Renomear colunas para snake_case minúsculo
     col_map_app = {
         "ID_CLIENTE_ATUAL": "id_cliente_atual",
@@ -53,23 +104,15 @@ def create_database():
         "FAIXA_ETARIA": "faixa_etaria",
         "DATA_REGISTRO_PTBR": "data_registro_raw",
     }
-    # Aplicar renomeação (só colunas que existem)
-    df_app = df_app.rename(columns={k: v for k, v in col_map_app.items() if k in df_app.columns})
-
-    # Converter data DD/MM/YYYY -> YYYY-MM-DD
-    if "data_registro_raw" in df_app.columns:
-        df_app["data_registro"] = pd.to_datetime(
-            df_app["data_registro_raw"], format="%d/%m/%Y", errors="coerce"
-        ).dt.strftime("%Y-%m-%d")
-        df_app = df_app.drop(columns=["data_registro_raw"])
-    else:
-        print("[WARN] Coluna DATA_REGISTRO_PTBR nao encontrada no CSV")
+    # Renomear (só colunas que existem), validar e converter DD/MM/YYYY -> YYYY-MM-DD
+    df_app, df_app_bad = read_validated(CSV_APPLICATION, col_map_app, APPLICATION_SCHEMA, "application_data")
+
+    # Score de risco por contrato (NumPy, em batches)
+    df_app = df_app.assign(**{SCORE_COLUMN: score_dataframe(df_app)})
 
     print(f"  [OK] application_data: {len(df_app)} registros, {len(df_app.columns)} colunas")
 
     # --- previous_application ---
-    df_prev = pd.read_csv(CSV_PREVIOUS)
-
     col_map_prev = {
         "ID_CLIENTE_ANTERIOR": "id_cliente_anterior",
         "ID_CLIENTE_ATUAL": "id_cliente_atual",
@@ -84,23 +127,32 @@ def create_database():
         "CATEGORIA_BENS": "categoria_bens",
         "DATA_DECISAO_PTBR": "data_decisao_raw",
     }
-    df_prev = df_prev.rename(columns={k: v for k, v in col_map_prev.items() if k in df_prev.columns})
-
-    if "data_decisao_raw" in df_prev.columns:
-        df_prev["data_decisao"] = pd.to_datetime(
-            df_prev["data_decisao_raw"], format="%d/%m/%Y", errors="coerce"
-        ).dt.strftime("%Y-%m-%d")
-        df_prev = df_prev.drop(columns=["data_decisao_raw"])
+    df_prev, df_prev_bad = read_validated(CSV_PREVIOUS, col_map_prev, PREVIOUS_SCHEMA, "previous_application")
 
     print(f"  [OK] previous_application: {len(df_prev)} registros, {len(df_prev.columns)} colunas")
 
     # --- Gravar no SQLite ---
-    print(f"\n[INFO] Gravando em {DB_PATH}...")
+    # Snapshot novo em data/versions/: os workers continuam no atual até a publicação
+    version, db_path = new_db_version()
+    print(f"\n[INFO] Gravando em {db_path}...")
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     df_app.to_sql("application_data", conn, if_exists="replace", index=False)
     df_prev.to_sql("previous_application", conn, if_exists="replace", index=False)
 
+    # Linhas rejeitadas pela validação, com os motivos
+    df_app_bad.to_sql("application_quarantine", conn, if_exists="replace", index=False)
+    df_prev_bad.to_sql("previous_quarantine", conn, if_exists="replace", index=False)
+
+    df_sample = build_stratified_sample(df_app)
+    df_sample.to_sql("application_sample", conn, if_exists="replace", index=False)
+    print(f"  [OK] application_sample: {len(df_sample)} registros ({df_sample['estrato'].nunique()} estratos)")
+
+    # Sketches de quantis por célula (mês × dimensões), mescláveis no dashboard
+    df_sketch = build_sketches(df_app)
+    df_sketch.to_sql(SKETCH_TABLE, conn, if_exists="replace", index=False)
+    print(f"  [OK] {SKETCH_TABLE}: {len(df_sketch)} buckets")
+
     # Criar indices para performance
     conn.execute("CREATE INDEX IF NOT EXISTS idx_app_data_registro ON application_data(data_registro)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_app_tipo_contrato ON application_data(tipo_contrato)")
@@ -110,8 +162,16 @@ def create_database():
     conn.commit()
     conn.close()
 
+    # Store colunar da versão nova antes da publicação: os workers trocam de
+    # versão com o store já pronto, sem varrer a tabela no primeiro request
+    store_path = build_store(version)
+    print(f"  [OK] store colunar: {store_path}")
+
+    publish_db_version(version)
+
     print("[OK] Banco de dados criado com sucesso!")
-    print(f"     Caminho: {DB_PATH}")
+    print(f"     Caminho: {db_path}")
+    print(f"     Versão publicada: {version}")
 
 
 if __name__ == "__main__":
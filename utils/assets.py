@@ -0,0 +1,17 @@
+"""
+Assets — Arquivos estáticos carregados uma vez por processo
+"""
+import os
+from functools import lru_cache
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+
+@lru_cache(maxsize=None)
+def load_css(name: str = "style.css") -> str:
+    """Bloco <style> pronto para st.markdown ('' se o arquivo não existir)."""
+    path = os.path.join(ASSETS_DIR, name)
+    if not os.path.exists(path):
+        return ""
+    with open(path) as f:
+        return f"<style>{f.read()}</style>"
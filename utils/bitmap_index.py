@@ -0,0 +1,109 @@
+"""
+Bitmap Index — Índices de bitmap em memória para os filtros globais
+
+Um bitset por valor de categoria (genero, tipo_contrato, faixa_etaria), por
+ano e por mês do ano, construídos uma vez por versão dos dados sobre o
+store compartilhado. Qualquer combinação de filtros vira uma sequência de
+ANDs sobre palavras de 64 bits.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.database import get_data_version
+from utils.shared_store import DATE_COLUMN, KEEP_VERSIONS, SharedTable, get_shared_table
+
+# Filtro -> coluna categórica indexada
+INDEXED_FILTERS = {
+    "gender": "genero",
+    "contractType": "tipo_contrato",
+    "ageRange": "faixa_etaria",
+}
+
+# Quantos resultados materializados (versão × filtros) manter por processo
+MAX_FRAMES = 4
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    """Máscara booleana -> bitset em palavras uint64 (padding zerado)."""
+    packed = np.packbits(mask)
+    padding = (-len(packed)) % 8
+    if padding:
+        packed = np.concatenate([packed, np.zeros(padding, dtype=np.uint8)])
+    return packed.view(np.uint64)
+
+
+class BitmapIndex:
+    """Bitsets por valor de filtro sobre uma SharedTable."""
+
+    def __init__(self, table: SharedTable):
+        self.n_rows = table.n_rows
+        self.all = _pack(np.ones(self.n_rows, dtype=bool))
+        self.empty = np.zeros_like(self.all)
+
+        self.categories = {}
+        for column in INDEXED_FILTERS.values():
+            codes = np.asarray(table.columns[column])
+            self.categories[column] = {
+                value: _pack(codes == code) for code, value in enumerate(table.vocab[column])
+            }
+
+        # Ano e mês do ano separados: ano ∧ mês cobre qualquer mês específico
+        # com ~40 bitsets em vez de um por mês do histórico
+        datas = np.asarray(table.columns[DATE_COLUMN])
+        valid = ~np.isnat(datas)
+        years = datas.astype("datetime64[Y]").astype(np.int64) + 1970
+        months = datas.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        self.years = {int(y): _pack(valid & (years == y)) for y in np.unique(years[valid])}
+        self.months = {m: _pack(valid & (months == m)) for m in range(1, 13)}
+
+    def select(self, filters: dict = None) -> np.ndarray:
+        """Bitset das linhas que satisfazem os filtros (mesma semântica de build_filter_clause)."""
+        bits = self.all.copy()
+        if not filters:
+            return bits
+
+        year = filters.get("year", "todos")
+        if year and year != "todos":
+            bits &= self.years.get(int(year), self.empty)
+            month = filters.get("month", "todos")
+            if month and month != "todos":
+                bits &= self.months.get(int(month), self.empty)
+
+        for key, column in INDEXED_FILTERS.items():
+            value = filters.get(key, "todos")
+            if value and value != "todos":
+                bits &= self.categories[column].get(value, self.empty)
+
+        return bits
+
+    def rows(self, filters: dict = None) -> np.ndarray:
+        """Índices das linhas selecionadas, prontos para SharedTable.to_frame."""
+        bits = np.unpackbits(self.select(filters).view(np.uint8), count=self.n_rows)
+        return np.flatnonzero(bits)
+
+
+@lru_cache(maxsize=KEEP_VERSIONS)
+def _load(version: str) -> BitmapIndex:
+    return BitmapIndex(get_shared_table(version))
+
+
+def get_bitmap_index(version: str = None) -> BitmapIndex:
+    """Índice da versão atual dos dados (construído uma vez por processo)."""
+    return _load(version or get_data_version())
+
+
+@lru_cache(maxsize=MAX_FRAMES)
+def _frame(version: str, filter_key: tuple) -> pd.DataFrame:
+    rows = get_bitmap_index(version).rows(dict(filter_key))
+    return get_shared_table(version).to_frame(rows)
+
+
+def query_indexed(filters: dict = None) -> pd.DataFrame:
+    """
+    Linhas filtradas via bitmap index, materializadas a partir do store.
+    Cada (versão, filtros) é materializado uma vez por processo e o
+    DataFrame é compartilhado entre sessões — não alterar.
+    """
+    return _frame(get_data_version(), tuple(sorted((filters or {}).items())))
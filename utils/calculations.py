@@ -4,6 +4,8 @@ Calculations — Port das funções de cálculo do JavaScript para Python/Pandas
 import pandas as pd
 import numpy as np
 
+from utils.database import FAIXAS_ETARIAS
+
 
 def calculate_volume(df: pd.DataFrame) -> dict:
     """Calcula volume total e valor solicitado."""
@@ -43,55 +45,111 @@ def calculate_taxa_eficiencia(df: pd.DataFrame) -> float:
     return (concedido / solicitado) * 100
 
 
+def risco_relativo(taxa: float, taxa_global: float) -> float:
+    """Razão entre uma taxa e a taxa global (0 se a global for zero)."""
+    if taxa_global == 0:
+        return 0
+    return taxa / taxa_global
+
+
 def calculate_risco_relativo(df_filtered: pd.DataFrame, df_global: pd.DataFrame) -> float:
     """Calcula risco relativo comparado à média global."""
     taxa_filtrada = calculate_taxa_inadimplencia(df_filtered)
     taxa_global = calculate_taxa_inadimplencia(df_global)
-    if taxa_global == 0:
-        return 0
-    return taxa_filtrada / taxa_global
+    return risco_relativo(taxa_filtrada, taxa_global)
+
+
+# Granularidades suportadas: (formato do período, formato do rótulo)
+GRANULARITY_FORMATS = {
+    "daily": ("%Y-%m-%d", "%d/%m/%Y"),
+    "weekly": ("%Y-%m-%d", "%d/%m/%Y"),
+    "monthly": ("%Y-%m", "%m/%Y"),
+}
+
+
+def auto_granularity(date_range: int) -> str:
+    """Granularidade do modo 'auto': até 60 dias diário, acima disso mensal."""
+    return "daily" if date_range <= 60 else "monthly"
+
+
+def bucket_periods(datas: pd.Series, granularity: str) -> pd.DataFrame:
+    """Período (chave ordenável), rótulo e data de início do bucket de cada data."""
+    if granularity == "quarterly":
+        trimestre = datas.dt.to_period("Q")
+        return pd.DataFrame({
+            "periodo": trimestre.astype(str),
+            "label": "T" + trimestre.dt.quarter.astype(str) + "/" + trimestre.dt.year.astype(str),
+            "data": trimestre.dt.start_time,
+        }, index=datas.index)
+
+    if granularity == "weekly":
+        # Semana começando na segunda-feira
+        datas = datas.dt.normalize() - pd.to_timedelta(datas.dt.weekday, unit="D")
+    fmt_periodo, fmt_label = GRANULARITY_FORMATS.get(granularity, GRANULARITY_FORMATS["monthly"])
+    periodo = datas.dt.strftime(fmt_periodo)
+    return pd.DataFrame({
+        "periodo": periodo,
+        "label": datas.dt.strftime(fmt_label),
+        "data": pd.to_datetime(periodo),
+    }, index=datas.index)
+
+
+def evolution_by_period(datas: pd.Series, somas: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    """
+    Soma volume, quantidade e inadimplentes (colunas de `somas`, uma linha por
+    data) em cada período e calcula taxa e ticket médio.
+    """
+    work = pd.concat([bucket_periods(datas, granularity), somas], axis=1)
+    grouped = work.groupby("periodo").agg(
+        label=("label", "first"),
+        data=("data", "first"),
+        volume=("volume", "sum"),
+        quantidade=("quantidade", "sum"),
+        inadimplentes=("inadimplentes", "sum"),
+    ).reset_index()
+
+    grouped = grouped.sort_values("periodo")
+    grouped["taxa_inadimplencia"] = (grouped["inadimplentes"] / grouped["quantidade"]) * 100
+    grouped["ticket_medio"] = grouped["volume"] / grouped["quantidade"]
+    return grouped
 
 
 def calculate_temporal_evolution(df: pd.DataFrame, granularity: str = "auto") -> pd.DataFrame:
     """
     Calcula evolução temporal com granularidade dinâmica.
-    granularity: 'auto', 'daily', 'monthly'
+    granularity: 'auto', 'daily', 'weekly', 'monthly', 'quarterly'
     """
     if df.empty or "data_registro" not in df.columns:
         return pd.DataFrame()
 
-    df_work = df.copy()
-    df_work["data_registro"] = pd.to_datetime(df_work["data_registro"], errors="coerce")
-    df_work = df_work.dropna(subset=["data_registro"])
-
-    if df_work.empty:
+    datas = pd.to_datetime(df["data_registro"], errors="coerce")
+    valid = datas.notna()
+    if not valid.any():
         return pd.DataFrame()
+    datas = datas[valid]
 
     # Determinar granularidade
-    use_daily = granularity == "daily"
     if granularity == "auto":
-        date_range = (df_work["data_registro"].max() - df_work["data_registro"].min()).days
-        use_daily = date_range <= 60
+        granularity = auto_granularity((datas.max() - datas.min()).days)
 
-    if use_daily:
-        df_work["periodo"] = df_work["data_registro"].dt.strftime("%Y-%m-%d")
-        df_work["label"] = df_work["data_registro"].dt.strftime("%d/%m")
-    else:
-        df_work["periodo"] = df_work["data_registro"].dt.strftime("%Y-%m")
-        df_work["label"] = df_work["data_registro"].dt.strftime("%m/%Y")
+    somas = pd.DataFrame({
+        "volume": df.loc[valid, "valor_credito"].astype(float),
+        "quantidade": df.loc[valid, "id_cliente_atual"].notna().astype(np.int64),
+        "inadimplentes": (df.loc[valid, "alvo_inadimplencia"] == 1).astype(np.int64),
+    })
+    return evolution_by_period(datas, somas, granularity)
 
-    grouped = df_work.groupby("periodo").agg(
-        label=("label", "first"),
-        volume=("valor_credito", lambda x: x.astype(float).sum()),
-        quantidade=("id_cliente_atual", "count"),
-        inadimplentes=("alvo_inadimplencia", lambda x: (x == 1).sum()),
-    ).reset_index()
 
-    grouped = grouped.sort_values("periodo")
+def finalize_age_distribution(grouped: pd.DataFrame, total: int) -> pd.DataFrame:
+    """Percentual, taxa e ordem de exibição sobre os totais por faixa etária."""
+    grouped["percentual"] = (grouped["quantidade"] / total) * 100
     grouped["taxa_inadimplencia"] = (grouped["inadimplentes"] / grouped["quantidade"]) * 100
-    grouped["ticket_medio"] = grouped["volume"] / grouped["quantidade"]
 
-    return grouped
+    # Ordem customizada
+    grouped["ordem"] = grouped["faixa_etaria"].apply(
+        lambda x: FAIXAS_ETARIAS.index(x) if x in FAIXAS_ETARIAS else 99
+    )
+    return grouped.sort_values("ordem").drop(columns=["ordem"])
 
 
 def calculate_age_distribution(df: pd.DataFrame) -> pd.DataFrame:
@@ -99,24 +157,19 @@ def calculate_age_distribution(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty or "faixa_etaria" not in df.columns:
         return pd.DataFrame()
 
-    total = len(df)
     grouped = df.groupby("faixa_etaria").agg(
         quantidade=("id_cliente_atual", "count"),
         volume=("valor_credito", lambda x: x.astype(float).sum()),
         inadimplentes=("alvo_inadimplencia", lambda x: (x == 1).sum()),
     ).reset_index()
 
-    grouped["percentual"] = (grouped["quantidade"] / total) * 100
-    grouped["taxa_inadimplencia"] = (grouped["inadimplentes"] / grouped["quantidade"]) * 100
+    return finalize_age_distribution(grouped, len(df))
 
-    # Ordem customizada
-    ordem = ["<25", "25-35", "35-45", "45-60", "60+", ">60"]
-    grouped["ordem"] = grouped["faixa_etaria"].apply(
-        lambda x: ordem.index(x) if x in ordem else 99
-    )
-    grouped = grouped.sort_values("ordem").drop(columns=["ordem"])
 
-    return grouped
+def finalize_field_groups(grouped: pd.DataFrame, field: str) -> pd.DataFrame:
+    """Totais por valor do campo (value, count, inadimplentes), ordenados por volume."""
+    grouped = grouped.rename(columns={field: "label"})
+    return grouped.sort_values("value", ascending=False)
 
 
 def group_by_field(df: pd.DataFrame, field: str) -> pd.DataFrame:
@@ -130,9 +183,13 @@ def group_by_field(df: pd.DataFrame, field: str) -> pd.DataFrame:
         inadimplentes=("alvo_inadimplencia", lambda x: (x == 1).sum()),
     ).reset_index()
 
-    grouped = grouped.rename(columns={field: "label"})
-    grouped = grouped.sort_values("value", ascending=False)
-    return grouped
+    return finalize_field_groups(grouped, field)
+
+
+def finalize_risk_heatmap(grouped: pd.DataFrame, row_field: str, col_field: str) -> pd.DataFrame:
+    """Taxa por célula (total, inadimplentes) pivotada no formato do heatmap."""
+    grouped["taxa"] = (grouped["inadimplentes"] / grouped["total"]) * 100
+    return grouped.pivot_table(index=row_field, columns=col_field, values="taxa", fill_value=0)
 
 
 def generate_risk_heatmap(df: pd.DataFrame, row_field: str = "escolaridade", col_field: str = "tipo_renda") -> pd.DataFrame:
@@ -149,25 +206,27 @@ def generate_risk_heatmap(df: pd.DataFrame, row_field: str = "escolaridade", col
         inadimplentes=("alvo_inadimplencia", lambda x: (x == 1).sum()),
     ).reset_index()
 
-    grouped["taxa"] = (grouped["inadimplentes"] / grouped["total"]) * 100
+    return finalize_risk_heatmap(grouped, row_field, col_field)
 
-    # Pivotar para formato de heatmap
-    pivot = grouped.pivot_table(
-        index=row_field, columns=col_field, values="taxa", fill_value=0
-    )
 
-    return pivot
+def segment_label(escolaridade: pd.Series, tipo_renda: pd.Series) -> pd.Series:
+    """Rótulo do segmento escolaridade + tipo renda (nulos viram N/A)."""
+    return escolaridade.fillna("N/A") + " + " + tipo_renda.fillna("N/A")
 
 
-def get_top_critical_segments(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
-    """Identifica top N segmentos mais críticos (escolaridade + tipo renda)."""
+def finalize_segment_rates(grouped: pd.DataFrame) -> pd.DataFrame:
+    """Taxa de inadimplência sobre os totais por segmento."""
+    grouped["taxa_inadimplencia"] = (grouped["inadimplentes"] / grouped["qtd_contratos"]) * 100
+    return grouped
+
+
+def calculate_segment_rates(df: pd.DataFrame) -> pd.DataFrame:
+    """Taxa de inadimplência de todos os segmentos (escolaridade + tipo renda)."""
     if df.empty:
         return pd.DataFrame()
 
     df_work = df.copy()
-    df_work["segmento"] = (
-        df_work["escolaridade"].fillna("N/A") + " + " + df_work["tipo_renda"].fillna("N/A")
-    )
+    df_work["segmento"] = segment_label(df_work["escolaridade"], df_work["tipo_renda"])
 
     grouped = df_work.groupby("segmento").agg(
         qtd_contratos=("id_cliente_atual", "count"),
@@ -175,7 +234,110 @@ def get_top_critical_segments(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
         inadimplentes=("alvo_inadimplencia", lambda x: (x == 1).sum()),
     ).reset_index()
 
-    grouped["taxa_inadimplencia"] = (grouped["inadimplentes"] / grouped["qtd_contratos"]) * 100
-    grouped = grouped.sort_values("taxa_inadimplencia", ascending=False).head(n)
+    return finalize_segment_rates(grouped)
 
-    return grouped
+
+def rank_critical_segments(segments: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    """Top N segmentos (saída de calculate_segment_rates) pela taxa de inadimplência."""
+    if segments.empty:
+        return segments
+    return segments.sort_values("taxa_inadimplencia", ascending=False).head(n)
+
+
+def get_top_critical_segments(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    """Identifica top N segmentos mais críticos (escolaridade + tipo renda)."""
+    return rank_critical_segments(calculate_segment_rates(df), n)
+
+
+def calculate_risk_badges(segments: pd.DataFrame, taxa_global: float, min_contratos: int = 30) -> dict:
+    """
+    Segmentos de menor, mediano e maior risco (saída de calculate_segment_rates)
+    com o risco relativo à taxa global. Segmentos com menos de `min_contratos`
+    são ignorados, a menos que nenhum atinja o mínimo.
+    """
+    if segments.empty:
+        return {}
+
+    elegiveis = segments[segments["qtd_contratos"] >= min_contratos]
+    if elegiveis.empty:
+        elegiveis = segments
+    ordenados = elegiveis.sort_values(["taxa_inadimplencia", "qtd_contratos"], ascending=[True, False])
+
+    posicoes = {"baixo": 0, "medio": (len(ordenados) - 1) // 2, "alto": len(ordenados) - 1}
+    badges = {}
+    for nivel, pos in posicoes.items():
+        row = ordenados.iloc[pos]
+        badges[nivel] = {
+            "segmento": row["segmento"],
+            "taxa_inadimplencia": row["taxa_inadimplencia"],
+            "qtd_contratos": int(row["qtd_contratos"]),
+            "risco_relativo": risco_relativo(row["taxa_inadimplencia"], taxa_global),
+        }
+    return badges
+
+
+# --- Modo aproximado (amostra estratificada) ---
+
+Z_95 = 1.96
+
+
+def _stratified_total(df_sample: pd.DataFrame, values: pd.Series) -> tuple:
+    """
+    Estimador de total por domínio em amostragem estratificada.
+    Retorna (total estimado, variância). As unidades da amostra fora do
+    domínio filtrado entram como zero, via n_estrato.
+    """
+    work = pd.DataFrame({
+        "estrato": df_sample["estrato"],
+        "N": df_sample["pop_estrato"].astype(float),
+        "n": df_sample["n_estrato"].astype(float),
+        "y": values.astype(float),
+    })
+    work["y2"] = work["y"] ** 2
+
+    strata = work.groupby("estrato").agg(
+        N=("N", "first"), n=("n", "first"), soma=("y", "sum"), soma2=("y2", "sum"),
+    )
+    total = (strata["N"] / strata["n"] * strata["soma"]).sum()
+
+    media = strata["soma"] / strata["n"]
+    s2 = (strata["soma2"] - strata["n"] * media ** 2) / (strata["n"] - 1).clip(lower=1)
+    fpc = 1 - strata["n"] / strata["N"]
+    variancia = (strata["N"] ** 2 * fpc * s2 / strata["n"]).sum()
+    return total, max(variancia, 0.0)
+
+
+def estimate_kpis(df_sample: pd.DataFrame, z: float = Z_95) -> dict:
+    """
+    Estima os KPIs a partir da amostra estratificada.
+    Cada métrica retorna {'valor': estimativa, 'margem': meia-largura do IC}.
+    """
+    vazio = {"valor": 0, "margem": 0}
+    if df_sample.empty or "estrato" not in df_sample.columns:
+        return {k: dict(vazio) for k in ["total_volume", "ticket_medio", "total_contratos", "taxa_inadimplencia"]}
+
+    um = pd.Series(1.0, index=df_sample.index)
+    volume = df_sample["valor_credito"].astype(float)
+    inad = (df_sample["alvo_inadimplencia"] == 1).astype(float)
+
+    total_contratos, var_contratos = _stratified_total(df_sample, um)
+    total_volume, var_volume = _stratified_total(df_sample, volume)
+    total_inad, _ = _stratified_total(df_sample, inad)
+
+    def ratio(numerador, total_num):
+        # Estimador de razão com variância por linearização
+        if not total_contratos:
+            return 0, 0
+        r = total_num / total_contratos
+        _, var = _stratified_total(df_sample, (numerador - r * um) / total_contratos)
+        return r, var
+
+    ticket, var_ticket = ratio(volume, total_volume)
+    taxa, var_taxa = ratio(inad, total_inad)
+
+    return {
+        "total_volume": {"valor": total_volume, "margem": z * np.sqrt(var_volume)},
+        "ticket_medio": {"valor": ticket, "margem": z * np.sqrt(var_ticket)},
+        "total_contratos": {"valor": total_contratos, "margem": z * np.sqrt(var_contratos)},
+        "taxa_inadimplencia": {"valor": taxa * 100, "margem": z * np.sqrt(var_taxa) * 100},
+    }
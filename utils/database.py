@@ -1,27 +1,141 @@
 """
 Database — Conexão e queries SQLite
 """
+from __future__ import annotations
+
 import sqlite3
-import pandas as pd
 import os
+import time
+
+from utils.lazy import lazy_module
+
+# pandas só é importado na primeira query (a página inicial não precisa dele)
+pd = lazy_module("pandas")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Modo legado: arquivo único reescrito pelo setup
+DB_PATH = os.path.join(DATA_DIR, "credito.db")
+
+# Modo versionado: cada ingestão gera um snapshot imutável em versions/ e troca
+# atomicamente o ponteiro CURRENT. Os workers leem o ponteiro a cada conexão.
+VERSIONS_DIR = os.path.join(DATA_DIR, "versions")
+CURRENT_FILE = os.path.join(DATA_DIR, "CURRENT")
+KEEP_DB_VERSIONS = 3
+LEGACY_PREFIX = "legacy-"
+
+# Linhas por chunk nas leituras em streaming
+CHUNK_SIZE = 50_000
+
+# Faixas etárias aceitas, na ordem de exibição (filtros, validação e agregações)
+FAIXAS_ETARIAS = ["<25", "25-35", "35-45", "45-60", "60+", ">60"]
+
+_current = {"key": None, "version": None}
 
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "credito.db")
 
+def get_current_version() -> str | None:
+    """Versão publicada em CURRENT (None = modo legado, sem ponteiro)."""
+    try:
+        stat = os.stat(CURRENT_FILE)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns)
+    if _current["key"] != key:
+        with open(CURRENT_FILE) as f:
+            _current["version"] = f.read().strip() or None
+        _current["key"] = key
+    return _current["version"]
 
-def get_connection():
-    """Retorna conexão SQLite."""
-    return sqlite3.connect(DB_PATH)
+
+def resolve_db_path(version: str = None) -> str:
+    """Arquivo do banco de uma versão (padrão: a versão atual)."""
+    version = version or get_current_version()
+    if version is None or version.startswith(LEGACY_PREFIX):
+        return DB_PATH
+    return os.path.join(VERSIONS_DIR, f"{version}.db")
+
+
+def get_connection(version: str = None):
+    """
+    Retorna conexão SQLite. Snapshots versionados nunca mudam depois de
+    publicados, então abrem como somente leitura e imutáveis (sem locks).
+    """
+    path = resolve_db_path(version)
+    if path == DB_PATH:
+        return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
 
 
 def db_exists():
     """Verifica se o banco existe."""
-    return os.path.exists(DB_PATH)
+    return os.path.exists(resolve_db_path())
 
 
-def query_application_data(filters: dict = None) -> pd.DataFrame:
+def new_db_version() -> tuple:
+    """Reserva (versão, caminho) para um novo snapshot a ser publicado."""
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version = time.strftime("credito-%Y%m%dT%H%M%SZ", time.gmtime()) + f"-{os.getpid()}"
+    return version, os.path.join(VERSIONS_DIR, f"{version}.db")
+
+
+def publish_db_version(version: str):
     """
-    Busca dados de application_data com filtros opcionais.
-    
+    Troca atomicamente o ponteiro CURRENT para `version`. Conexões abertas
+    continuam lendo o snapshot anterior até serem fechadas.
+    """
+    tmp = f"{CURRENT_FILE}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, CURRENT_FILE)
+    _cleanup_db_versions(keep=version)
+
+
+def _cleanup_db_versions(keep: str):
+    # Nomes carregam o timestamp: ordem alfabética = ordem de criação.
+    # Em POSIX, leitores com o arquivo aberto não são afetados pela remoção.
+    snapshots = sorted(f for f in os.listdir(VERSIONS_DIR) if f.endswith(".db"))
+    antigos = [f for f in snapshots if f != f"{keep}.db"][:-(KEEP_DB_VERSIONS - 1) or None]
+    for name in antigos:
+        try:
+            os.remove(os.path.join(VERSIONS_DIR, name))
+        except OSError:
+            pass
+
+
+def check_readiness() -> tuple:
+    """
+    Verifica se o banco está pronto para servir o dashboard.
+    Retorna (pronto, mensagem). O setup roda fora do request: setup_database.py.
+    """
+    if not db_exists():
+        return False, "Banco de dados não encontrado."
+    conn = get_connection()
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError as exc:
+        return False, f"Banco de dados inválido: {exc}"
+    finally:
+        conn.close()
+    if "application_data" not in tables:
+        return False, "Tabela application_data ausente."
+    return True, ""
+
+
+def get_data_version() -> str:
+    """Identificador da versão dos dados (muda a cada recarga do banco)."""
+    version = get_current_version()
+    if version is not None:
+        return version
+    stat = os.stat(DB_PATH)
+    return f"{LEGACY_PREFIX}{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def build_filter_clause(filters: dict = None) -> tuple:
+    """
+    Monta a cláusula WHERE e os parâmetros para os filtros globais.
+
     filters: {
         'year': str ('todos' ou '2023'),
         'month': str ('todos' ou '1'-'12'),
@@ -30,18 +144,16 @@ def query_application_data(filters: dict = None) -> pd.DataFrame:
         'ageRange': str ('todos' ou valor),
     }
     """
-    conn = get_connection()
-    
-    query = "SELECT * FROM application_data WHERE 1=1"
+    where = "1=1"
     params = []
-    
+
     if filters:
         # Filtro de ano
         year = filters.get("year", "todos")
         if year and year != "todos":
-            query += " AND data_registro >= ? AND data_registro <= ?"
+            where += " AND data_registro >= ? AND data_registro <= ?"
             params.extend([f"{year}-01-01", f"{year}-12-31"])
-            
+
             # Filtro de mês (só se ano específico)
             month = filters.get("month", "todos")
             if month and month != "todos":
@@ -52,28 +164,104 @@ def query_application_data(filters: dict = None) -> pd.DataFrame:
                 else:
                     end = f"{year}-{m+1:02d}-01"
                 # Substituir os filtros de ano pelo intervalo mais restrito
-                query = "SELECT * FROM application_data WHERE data_registro >= ? AND data_registro < ?"
+                where = "data_registro >= ? AND data_registro < ?"
                 params = [start, end]
-        
+
         # Gênero
         gender = filters.get("gender", "todos")
         if gender and gender != "todos":
-            query += " AND genero = ?"
+            where += " AND genero = ?"
             params.append(gender)
-        
+
         # Tipo contrato
         contract = filters.get("contractType", "todos")
         if contract and contract != "todos":
-            query += " AND tipo_contrato = ?"
+            where += " AND tipo_contrato = ?"
             params.append(contract)
-        
+
         # Faixa etária
         age = filters.get("ageRange", "todos")
         if age and age != "todos":
-            query += " AND faixa_etaria = ?"
+            where += " AND faixa_etaria = ?"
             params.append(age)
-    
-    df = pd.read_sql_query(query, conn, params=params)
+
+    return where, params
+
+
+def query_application_data(filters: dict = None) -> pd.DataFrame:
+    """Busca dados de application_data com filtros opcionais (ver build_filter_clause)."""
+    conn = get_connection()
+    where, params = build_filter_clause(filters)
+    df = pd.read_sql_query(f"SELECT * FROM application_data WHERE {where}", conn, params=params)
+    conn.close()
+    return df
+
+
+def get_table_columns(table: str = "application_data", version: str = None) -> list:
+    """Retorna [(coluna, tipo declarado)] da tabela."""
+    conn = get_connection(version)
+    rows = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    conn.close()
+    return [(row[1], row[2]) for row in rows]
+
+
+def iter_application_data(filters: dict = None, columns: list = None, chunksize: int = CHUNK_SIZE,
+                          version: str = None):
+    """
+    Itera application_data filtrado em chunks de DataFrame, lendo do cursor
+    com fetchmany — o resultado completo nunca é materializado.
+    columns: projeção opcional (padrão: todas as colunas).
+    version: snapshot a ler (padrão: o atual no início da iteração).
+    """
+    version = version or get_current_version()
+    if columns:
+        known = {name for name, _ in get_table_columns(version=version)}
+        unknown = [c for c in columns if c not in known]
+        if unknown:
+            raise ValueError(f"Colunas inexistentes em application_data: {unknown}")
+        projection = ", ".join(f'"{c}"' for c in columns)
+    else:
+        projection = "*"
+
+    where, params = build_filter_clause(filters)
+    return _iter_query(f"SELECT {projection} FROM application_data WHERE {where}", params, chunksize, version)
+
+
+def _iter_query(sql: str, params: list, chunksize: int, version: str = None):
+    conn = get_connection(version)
+    try:
+        cursor = conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=names)
+    finally:
+        conn.close()
+
+
+def sample_exists() -> bool:
+    """Verifica se a amostra estratificada foi gerada no setup."""
+    if not db_exists():
+        return False
+    conn = get_connection()
+    result = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'application_sample'"
+    ).fetchone()
+    conn.close()
+    return result is not None
+
+
+def query_application_sample(filters: dict = None) -> pd.DataFrame:
+    """
+    Busca a amostra estratificada (alvo_inadimplencia × tipo_contrato) com os
+    mesmos filtros de query_application_data. Custo fixo, independente do
+    tamanho de application_data.
+    """
+    conn = get_connection()
+    where, params = build_filter_clause(filters)
+    df = pd.read_sql_query(f"SELECT * FROM application_sample WHERE {where}", conn, params=params)
     conn.close()
     return df
 
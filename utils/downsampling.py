@@ -0,0 +1,98 @@
+"""
+Downsampling — Redução adaptativa de séries temporais para os gráficos
+"""
+import pandas as pd
+import numpy as np
+
+from utils.calculations import calculate_temporal_evolution
+
+# Orçamento padrão de pontos enviados ao Plotly por série
+MAX_POINTS = 120
+
+# Duração aproximada (em dias) de cada bucket, da mais fina para a mais grossa
+BUCKET_DAYS = [
+    ("daily", 1),
+    ("weekly", 7),
+    ("monthly", 30.44),
+    ("quarterly", 91.31),
+]
+
+
+def choose_granularity(df: pd.DataFrame, max_points: int = MAX_POINTS) -> str:
+    """
+    Escolhe a granularidade mais fina que cabe no orçamento de pontos.
+    Mantém a regra original de só usar diário até 60 dias.
+    """
+    if df.empty or "data_registro" not in df.columns:
+        return "auto"
+
+    datas = pd.to_datetime(df["data_registro"], errors="coerce").dropna()
+    if datas.empty:
+        return "auto"
+
+    return granularity_for_range((datas.max() - datas.min()).days, max_points)
+
+
+def granularity_for_range(date_range: int, max_points: int = MAX_POINTS) -> str:
+    """Granularidade para um intervalo de `date_range` dias (regra de choose_granularity)."""
+    candidatas = BUCKET_DAYS if date_range <= 60 else BUCKET_DAYS[1:]
+    for granularity, dias in candidatas:
+        if date_range / dias <= max_points:
+            return granularity
+    return "quarterly"
+
+
+def lttb_indices(y: np.ndarray, n_out: int, x: np.ndarray = None) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: índices dos pontos que preservam
+    a forma visual da série. Sem `x`, o eixo x é a posição do bucket.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    # Buckets internos (o primeiro e o último ponto são sempre mantidos)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Área do triângulo (a, candidato, média do próximo bucket)
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def downsample_evolution(evo: pd.DataFrame, max_points: int = MAX_POINTS, value_col: str = "volume") -> pd.DataFrame:
+    """Aplica LTTB na série de evolução quando ela excede o orçamento de pontos (x = início do período, em dias)."""
+    if evo.empty or len(evo) <= max_points:
+        return evo
+
+    dias = (evo["data"] - evo["data"].min()) / pd.Timedelta(days=1)
+    idx = lttb_indices(evo[value_col].to_numpy(), max_points, dias.to_numpy())
+    return evo.iloc[idx].reset_index(drop=True)
+
+
+def prepare_temporal_evolution(df: pd.DataFrame, granularity: str = "auto", max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """
+    Evolução temporal pronta para o gráfico: bucketing adaptativo
+    seguido de LTTB, com no máximo `max_points` pontos.
+    """
+    if granularity == "auto":
+        granularity = choose_granularity(df, max_points)
+
+    evo = calculate_temporal_evolution(df, granularity=granularity)
+    return downsample_evolution(evo, max_points)
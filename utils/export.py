@@ -0,0 +1,115 @@
+"""
+Export — Snapshot compacto do recorte filtrado (CSV gzip, Parquet, Feather)
+"""
+import gzip
+import importlib.util
+import io
+
+from utils.database import CHUNK_SIZE, get_data_version, get_table_columns, iter_application_data
+
+# Formato -> (extensão, MIME)
+EXPORT_FORMATS = {
+    "csv": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "feather": (".feather", "application/vnd.apache.arrow.file"),
+}
+
+# Projeção padrão: colunas usadas pelo dashboard
+EXPORT_COLUMNS = [
+    "id_cliente_atual",
+    "data_registro",
+    "alvo_inadimplencia",
+    "tipo_contrato",
+    "genero",
+    "faixa_etaria",
+    "idade_anos",
+    "escolaridade",
+    "tipo_renda",
+    "renda_total",
+    "valor_credito",
+    "valor_anuidade",
+    "valor_total_bem",
+]
+
+# Tipos declarados no SQLite -> tipos Arrow
+_ARROW_TYPES = {"INTEGER": "int64", "REAL": "float64", "TEXT": "string"}
+
+
+def available_formats() -> list:
+    """Formatos disponíveis no ambiente (Parquet/Feather exigem pyarrow)."""
+    if importlib.util.find_spec("pyarrow") is None:
+        return ["csv"]
+    return list(EXPORT_FORMATS)
+
+
+def export_filename(fmt: str, base: str = "application_data") -> str:
+    return base + EXPORT_FORMATS[fmt][0]
+
+
+def _arrow_schema(columns: list, version: str = None):
+    """Schema Arrow a partir dos tipos declarados, estável entre chunks."""
+    import pyarrow as pa
+
+    declared = dict(get_table_columns(version=version))
+    return pa.schema([
+        (c, getattr(pa, _ARROW_TYPES.get(declared.get(c, "").upper(), "string"))())
+        for c in columns
+    ])
+
+
+def _write_csv(chunks, dest, columns: list) -> int:
+    total = 0
+    with gzip.open(dest, "wt", newline="", encoding="utf-8") as gz:
+        gz.write(",".join(columns) + "\n")
+        for chunk in chunks:
+            chunk.to_csv(gz, index=False, header=False)
+            total += len(chunk)
+    return total
+
+
+def _write_arrow(chunks, dest, fmt: str, columns: list, version: str = None) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError(f"Exportar em {fmt} requer pyarrow: pip install pyarrow") from exc
+
+    schema = _arrow_schema(columns, version)
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(dest, schema, compression="zstd")
+    else:
+        # Feather v2 = arquivo Arrow IPC
+        writer = ipc.new_file(dest, schema, options=ipc.IpcWriteOptions(compression="zstd"))
+
+    total = 0
+    with writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            total += len(chunk)
+    return total
+
+
+def export_application_data(filters: dict, dest, fmt: str = "csv", columns: list = None,
+                            chunksize: int = CHUNK_SIZE) -> int:
+    """
+    Exporta o recorte filtrado e projetado de application_data em streaming.
+    dest: caminho ou arquivo binário. Retorna o número de linhas exportadas.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato inválido: {fmt} (use {', '.join(EXPORT_FORMATS)})")
+
+    columns = columns or EXPORT_COLUMNS
+    # Schema e linhas do mesmo snapshot, mesmo que uma nova versão seja publicada no meio
+    version = get_data_version()
+    chunks = iter_application_data(filters, columns=columns, chunksize=chunksize, version=version)
+    if fmt == "csv":
+        return _write_csv(chunks, dest, columns)
+    return _write_arrow(chunks, dest, fmt, columns, version)
+
+
+def export_to_bytes(filters: dict, fmt: str = "csv", columns: list = None) -> tuple:
+    """Exporta para memória (para o botão de download). Retorna (bytes, linhas)."""
+    buffer = io.BytesIO()
+    linhas = export_application_data(filters, buffer, fmt, columns)
+    return buffer.getvalue(), linhas
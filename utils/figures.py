@@ -0,0 +1,61 @@
+"""
+Figures — Cache de figuras Plotly prontas, por tipo de gráfico e hash do resultado
+
+Cada gráfico é montado por uma função pura dos dados já calculados. A figura
+fica em memória (LRU, compartilhada entre sessões do processo) sob a chave
+(tipo do gráfico, hash dos resultados): um rerun com os mesmos dados reaproveita
+o objeto e gera exatamente o mesmo spec, que o Streamlit não reenvia ao
+navegador. Os builders passam arrays NumPy para os traces, que o Plotly ≥ 6
+(mínimo em requirements.txt) serializa como typed arrays em base64 em vez de
+listas de floats.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Quantas figuras manter por processo
+MAX_FIGURES = 64
+
+_figures = OrderedDict()
+_lock = threading.Lock()
+
+
+def result_hash(*parts) -> str:
+    """Hash estável de resultados calculados (DataFrames, arrays, escalares, dicts)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            labels = part.columns.tolist() if isinstance(part, pd.DataFrame) else part.name
+            h.update(repr(labels).encode())
+            h.update(repr(part.index.tolist()).encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            h.update(f"{part.dtype}{part.shape}".encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def cached_figure(chart: str, build, *results):
+    """
+    Figura de `chart` para estes resultados: build(*results) só roda na
+    primeira vez. A figura devolvida é compartilhada — não alterar.
+    """
+    key = (chart, result_hash(*results))
+    with _lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+            return fig
+
+    fig = build(*results)
+    with _lock:
+        _figures[key] = fig
+        while len(_figures) > MAX_FIGURES:
+            _figures.popitem(last=False)
+    return fig
@@ -0,0 +1,80 @@
+"""
+Lazy — Cálculos adiados e memoizados por assinatura de filtros, e imports sob demanda
+"""
+import importlib
+import sys
+from collections import OrderedDict
+
+# Quantas assinaturas de filtro manter em memória por sessão
+MAX_SIGNATURES = 8
+
+_PENDING = object()
+
+
+class Deferred:
+    """Handle para um cálculo que só é executado quando `get()` é chamado."""
+
+    def __init__(self, store: "DeferredCache", name: str, fn, args: tuple):
+        self._store = store
+        self._name = name
+        self._fn = fn
+        self._args = args
+
+    def get(self):
+        value = self._store.lookup(self._name)
+        if value is _PENDING:
+            value = self._fn(*self._args)
+            self._store.save(self._name, value)
+        return value
+
+
+class DeferredCache:
+    """
+    Memo de cálculos adiados por assinatura de filtros.
+    `cache` é um dict persistente entre reruns (ex.: st.session_state).
+    """
+
+    def __init__(self, cache: dict, signature: str, max_signatures: int = MAX_SIGNATURES):
+        self._entries = cache.setdefault("_deferred_cache", OrderedDict())
+        self._signature = signature
+        self._max_signatures = max_signatures
+
+    def defer(self, name: str, fn, *args) -> Deferred:
+        """Registra um cálculo sem executá-lo."""
+        return Deferred(self, name, fn, args)
+
+    def lookup(self, name: str):
+        bucket = self._entries.get(self._signature)
+        if bucket is None:
+            return _PENDING
+        self._entries.move_to_end(self._signature)
+        return bucket.get(name, _PENDING)
+
+    def save(self, name: str, value):
+        bucket = self._entries.setdefault(self._signature, {})
+        bucket[name] = value
+        self._entries.move_to_end(self._signature)
+        while len(self._entries) > self._max_signatures:
+            self._entries.popitem(last=False)
+
+
+class LazyModule:
+    """
+    Proxy que importa o módulo no primeiro acesso a um atributo. Não registra
+    nada em sys.modules antes disso (o Streamlit checa sys.modules para
+    decidir se carrega integrações com pandas/numpy).
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_module(name: str):
+    """Módulo já carregado, ou um LazyModule para dependências pesadas."""
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,238 @@
+"""
+Out-of-core — Cálculos de utils/calculations em streaming, para bases maiores que a RAM
+
+As linhas filtradas chegam do SQLite em chunks (cursor com fetchmany, via
+iter_application_data) e cada chunk vira agregados parciais: contagens,
+somas, inadimplentes e mapas por grupo. Os parciais são somados chunk a
+chunk, então a memória depende do número de grupos, não de linhas. Os
+finalizadores reproduzem as saídas das funções em memória (mesmas colunas,
+ordem e tipos; somas de ponto flutuante podem diferir só na ordem de soma).
+"""
+import pandas as pd
+import numpy as np
+
+from utils.bitmap_index import INDEXED_FILTERS
+from utils.calculations import (
+    auto_granularity,
+    evolution_by_period,
+    finalize_age_distribution,
+    finalize_field_groups,
+    finalize_risk_heatmap,
+    finalize_segment_rates,
+    rank_critical_segments,
+    segment_label,
+)
+from utils.database import CHUNK_SIZE, get_data_version, get_table_columns, iter_application_data
+from utils.downsampling import MAX_POINTS, downsample_evolution, granularity_for_range
+from utils.scoring import SCORE_COLUMN, finalize_score_distribution, score_band
+from utils.timeseries import MonthlyAggregates
+from utils.whatif import SEGMENT_DIMENSIONS, SegmentCube
+
+# Colunas lidas do banco (projeção do streaming)
+STREAM_COLUMNS = [
+    "id_cliente_atual", "alvo_inadimplencia", "valor_credito", "valor_total_bem",
+    "data_registro", "escolaridade", "tipo_renda", "faixa_etaria", "genero", "tipo_contrato",
+]
+
+# Dimensões do mapa de grupos; os agrupamentos por um ou dois campos saem dele
+GROUP_KEYS = list(SEGMENT_DIMENSIONS)
+
+# Chaves do mapa mensal (cubo das variações MoM/YoY e taxas móveis)
+MONTHLY_KEYS = ["mes", *INDEXED_FILTERS.values()]
+
+_SUMS = ["linhas", "contratos_id", "volume", "inadimplentes"]
+
+
+def _fold(acc: pd.DataFrame, part: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Soma dois mapas de grupos (chaves nulas preservadas)."""
+    if acc is None:
+        return part
+    return pd.concat([acc, part]).groupby(keys, dropna=False, sort=False).sum()
+
+
+def _partial(chunk: pd.DataFrame, keys: list) -> pd.DataFrame:
+    work = pd.DataFrame({
+        **{k: chunk[k] for k in keys},
+        "linhas": 1,
+        "contratos_id": chunk["id_cliente_atual"].notna().astype(np.int64),
+        "volume": chunk["valor_credito"].astype(float),
+        "inadimplentes": (chunk["alvo_inadimplencia"] == 1).astype(np.int64),
+    })
+    return work.groupby(keys, dropna=False, sort=False)[_SUMS].sum()
+
+
+class StreamingAggregates:
+    """Agregados parciais acumulados chunk a chunk, com finalizadores equivalentes a utils.calculations."""
+
+    def __init__(self):
+        self.n_rows = 0
+        self.totais = dict(volume=0.0, n_volume=0, solicitado=0.0, inadimplentes=0)
+        self.groups = None
+        self.daily = None
+        self.monthly = None
+        self.score = None
+        self.date_min = None
+        self.date_max = None
+
+    def update(self, chunk: pd.DataFrame):
+        """Acumula um chunk (colunas de STREAM_COLUMNS, score_risco opcional)."""
+        if chunk.empty:
+            return
+        self.n_rows += len(chunk)
+
+        credito = chunk["valor_credito"].astype(float)
+        self.totais["volume"] += credito.sum()
+        self.totais["n_volume"] += int(credito.notna().sum())
+        self.totais["solicitado"] += chunk["valor_total_bem"].astype(float).sum()
+        self.totais["inadimplentes"] += int((chunk["alvo_inadimplencia"] == 1).sum())
+
+        self.groups = _fold(self.groups, _partial(chunk, GROUP_KEYS), GROUP_KEYS)
+
+        datas = pd.to_datetime(chunk["data_registro"], errors="coerce")
+        valid = datas.notna()
+        if valid.any():
+            daily = _partial(chunk.loc[valid].assign(dia=datas[valid].dt.normalize()), ["dia"])
+            self.daily = _fold(self.daily, daily, ["dia"])
+            mes = datas[valid].dt.to_period("M").dt.start_time
+            self.monthly = _fold(self.monthly, _partial(chunk.loc[valid].assign(mes=mes), MONTHLY_KEYS), MONTHLY_KEYS)
+            lo, hi = datas[valid].min(), datas[valid].max()
+            self.date_min = lo if self.date_min is None else min(self.date_min, lo)
+            self.date_max = hi if self.date_max is None else max(self.date_max, hi)
+
+        if SCORE_COLUMN in chunk.columns:
+            score = chunk[SCORE_COLUMN].astype(float)
+            part = pd.DataFrame({
+                "faixa": score_band(score),
+                "quantidade": 1,
+                "inadimplentes": (chunk["alvo_inadimplencia"] == 1).astype(np.int64).to_numpy(),
+                "soma_score": score.fillna(0).to_numpy(),
+                "n_score": score.notna().astype(np.int64).to_numpy(),
+            }).groupby("faixa").sum()
+            self.score = part if self.score is None else self.score.add(part, fill_value=0)
+
+    # --- Escalares ---
+
+    def volume(self) -> dict:
+        return {"total_volume": self.totais["volume"], "total_solicitado": self.totais["solicitado"]}
+
+    def ticket_medio(self) -> float:
+        if not self.n_rows:
+            return 0
+        if not self.totais["n_volume"]:
+            return float("nan")
+        return self.totais["volume"] / self.totais["n_volume"]
+
+    def count_contratos(self) -> int:
+        return self.n_rows
+
+    def inadimplentes(self) -> int:
+        return self.totais["inadimplentes"]
+
+    def taxa_inadimplencia(self) -> float:
+        if not self.n_rows:
+            return 0
+        return (self.totais["inadimplentes"] / self.n_rows) * 100
+
+    def taxa_eficiencia(self) -> float:
+        if not self.n_rows or self.totais["solicitado"] == 0:
+            return 0
+        return (self.totais["volume"] / self.totais["solicitado"]) * 100
+
+    # --- Agrupamentos ---
+
+    def _by(self, keys: list, fill: str = None) -> pd.DataFrame:
+        """Mapa de grupos marginalizado nas chaves (nulos descartados, ou preenchidos com `fill`)."""
+        groups = self.groups.reset_index()
+        if fill is not None:
+            groups[keys] = groups[keys].fillna(fill)
+        return groups.groupby(keys)[_SUMS].sum().reset_index()
+
+    def age_distribution(self) -> pd.DataFrame:
+        if not self.n_rows:
+            return pd.DataFrame()
+        grouped = self._by(["faixa_etaria"]).rename(columns={"contratos_id": "quantidade"})
+        grouped = grouped[["faixa_etaria", "quantidade", "volume", "inadimplentes"]]
+        return finalize_age_distribution(grouped, self.n_rows)
+
+    def group_by_field(self, field: str) -> pd.DataFrame:
+        if not self.n_rows or field not in GROUP_KEYS:
+            return pd.DataFrame()
+        grouped = self._by([field]).rename(columns={"volume": "value", "contratos_id": "count"})
+        return finalize_field_groups(grouped[[field, "value", "count", "inadimplentes"]], field)
+
+    def risk_heatmap(self, row_field: str = "escolaridade", col_field: str = "tipo_renda") -> pd.DataFrame:
+        if not self.n_rows:
+            return pd.DataFrame()
+        grouped = self._by([row_field, col_field], fill="Não informado")
+        grouped = grouped.rename(columns={"contratos_id": "total"})
+        return finalize_risk_heatmap(grouped, row_field, col_field)
+
+    def segment_rates(self) -> pd.DataFrame:
+        if not self.n_rows:
+            return pd.DataFrame()
+        groups = self.groups.reset_index()
+        groups["segmento"] = segment_label(groups["escolaridade"], groups["tipo_renda"])
+        grouped = groups.groupby("segmento").agg(
+            qtd_contratos=("contratos_id", "sum"),
+            volume_exposto=("volume", "sum"),
+            inadimplentes=("inadimplentes", "sum"),
+        ).reset_index()
+        return finalize_segment_rates(grouped)
+
+    def top_critical_segments(self, n: int = 5) -> pd.DataFrame:
+        return rank_critical_segments(self.segment_rates(), n)
+
+    def segment_cube(self) -> SegmentCube:
+        if not self.n_rows:
+            return SegmentCube.from_frame(pd.DataFrame())
+        groups = self.groups.reset_index().rename(columns={"linhas": "contratos"})
+        return SegmentCube.from_groups(groups)
+
+    def score_distribution(self) -> pd.DataFrame:
+        if not self.n_rows or self.score is None:
+            return pd.DataFrame()
+        grouped = pd.DataFrame({
+            "quantidade": self.score["quantidade"].astype(np.int64),
+            "inadimplentes": self.score["inadimplentes"].astype(np.int64),
+            "score_medio": self.score["soma_score"] / self.score["n_score"],
+        })
+        return finalize_score_distribution(grouped, self.n_rows)
+
+    def monthly_aggregates(self) -> MonthlyAggregates:
+        """Cubo mensal equivalente a timeseries.get_monthly_aggregates (sobre as linhas agregadas)."""
+        if self.monthly is None:
+            return MonthlyAggregates.from_groups(pd.DataFrame(columns=MONTHLY_KEYS))
+        groups = self.monthly.reset_index().rename(columns={"linhas": "contratos"})
+        return MonthlyAggregates.from_groups(groups)
+
+    # --- Série temporal ---
+
+    def temporal_evolution(self, granularity: str = "auto") -> pd.DataFrame:
+        """Equivalente a calculate_temporal_evolution, a partir do mapa diário."""
+        if self.daily is None:
+            return pd.DataFrame()
+
+        if granularity == "auto":
+            granularity = auto_granularity((self.date_max - self.date_min).days)
+
+        daily = self.daily.sort_index().reset_index()
+        somas = daily[["volume", "contratos_id", "inadimplentes"]].rename(columns={"contratos_id": "quantidade"})
+        return evolution_by_period(daily["dia"], somas, granularity)
+
+    def prepare_temporal_evolution(self, granularity: str = "auto", max_points: int = MAX_POINTS) -> pd.DataFrame:
+        """Equivalente a downsampling.prepare_temporal_evolution."""
+        if granularity == "auto" and self.date_min is not None:
+            granularity = granularity_for_range((self.date_max - self.date_min).days, max_points)
+        return downsample_evolution(self.temporal_evolution(granularity), max_points)
+
+
+def aggregate_application_data(filters: dict = None, chunksize: int = CHUNK_SIZE, version: str = None) -> StreamingAggregates:
+    """Agrega application_data filtrado em streaming, um chunk por vez."""
+    version = version or get_data_version()
+    existing = {name for name, _ in get_table_columns(version=version)}
+    columns = STREAM_COLUMNS + ([SCORE_COLUMN] if SCORE_COLUMN in existing else [])
+
+    agg = StreamingAggregates()
+    for chunk in iter_application_data(filters, columns=columns, chunksize=chunksize, version=version):
+        agg.update(chunk)
+    return agg
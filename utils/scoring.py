@@ -0,0 +1,163 @@
+"""
+Scoring — Score de risco por contrato, vetorizado em NumPy
+
+Modelo logístico com pesos fixos sobre EXT_SOURCE_1/2/3, comprometimento de
+renda (crédito/renda, anuidade/renda), prazo implícito (crédito/anuidade) e a
+taxa de inadimplência do segmento escolaridade + tipo renda (leave-one-out,
+sem o rótulo do próprio contrato). O score vai de 0 a 1000 e corresponde à
+probabilidade estimada de inadimplência × 1000.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.calculations import calculate_segment_rates, segment_label
+
+# Linhas por batch: buffers temporários cabem no cache e a memória fica fixa
+BATCH_SIZE = 65_536
+
+SCORE_COLUMN = "score_risco"
+
+EXT_SOURCE_COLUMNS = ["EXT_SOURCE_1", "EXT_SOURCE_2", "EXT_SOURCE_3"]
+
+# Pesos do modelo (sobre o log-odds da taxa global)
+WEIGHTS = {
+    "ext_source": -4.0,       # por unidade acima de 0.5
+    "credito_renda": 0.08,    # por múltiplo da renda
+    "anuidade_renda": 2.0,    # fração da renda comprometida
+    "prazo": -0.01,           # por anuidade de prazo implícito
+    "segmento": 8.0,          # por ponto de taxa acima da global (fração)
+}
+
+# Encolhimento da taxa do segmento em direção à global (contratos "fictícios")
+SEGMENT_PRIOR = 50
+
+# Faixas de score: (limite superior exclusivo, rótulo)
+SCORE_BANDS = [
+    (30, "A"),
+    (60, "B"),
+    (100, "C"),
+    (200, "D"),
+    (np.inf, "E"),
+]
+
+
+def segment_rates_loo(df: pd.DataFrame) -> tuple:
+    """
+    Taxa do segmento de cada contrato, encolhida para a global e sem o
+    próprio rótulo (leave-one-out): (inad_seg - y_i + PRIOR * global) / (n_seg - 1 + PRIOR).
+    Assim a inadimplência observada por faixa de score não é in-sample.
+    Retorna (array de taxas, taxa_global), taxas como fração.
+    """
+    rates = calculate_segment_rates(df)
+    if rates.empty:
+        return np.full(len(df), np.nan), 0.0
+
+    taxa_global = rates["inadimplentes"].sum() / rates["qtd_contratos"].sum()
+    segmento = segment_label(df["escolaridade"], df["tipo_renda"])
+    rates = rates.set_index("segmento")
+    inad_seg = segmento.map(rates["inadimplentes"]).to_numpy(dtype=float)
+    n_seg = segmento.map(rates["qtd_contratos"]).to_numpy(dtype=float)
+    y = (df["alvo_inadimplencia"] == 1).to_numpy(dtype=float)
+
+    taxa = (inad_seg - y + SEGMENT_PRIOR * taxa_global) / (n_seg - 1 + SEGMENT_PRIOR)
+    return taxa, float(taxa_global)
+
+
+def score_batch(ext: np.ndarray, renda: np.ndarray, credito: np.ndarray,
+                anuidade: np.ndarray, taxa_segmento: np.ndarray, taxa_global: float) -> np.ndarray:
+    """
+    Score de um batch. ext: matriz (n, 3) com EXT_SOURCE_1/2/3 (NaN = ausente).
+    Valores ausentes ou inválidos assumem o ponto neutro de cada termo.
+    """
+    n_validos = np.sum(~np.isnan(ext), axis=1)
+    soma = np.nansum(ext, axis=1)
+    ext_media = np.divide(soma, n_validos, out=np.full(len(soma), 0.5), where=n_validos > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        credito_renda = np.where(renda > 0, credito / renda, 0.0)
+        anuidade_renda = np.where(renda > 0, anuidade / renda, 0.0)
+        prazo = np.where(anuidade > 0, credito / anuidade, 0.0)
+
+    taxa_global = min(max(taxa_global, 1e-4), 1 - 1e-4)
+    logit = np.full(len(soma), np.log(taxa_global / (1 - taxa_global)))
+    logit += WEIGHTS["ext_source"] * (ext_media - 0.5)
+    logit += WEIGHTS["credito_renda"] * np.clip(np.nan_to_num(credito_renda), 0, 20)
+    logit += WEIGHTS["anuidade_renda"] * np.clip(np.nan_to_num(anuidade_renda), 0, 1)
+    logit += WEIGHTS["prazo"] * np.clip(np.nan_to_num(prazo), 0, 60)
+    logit += WEIGHTS["segmento"] * (np.nan_to_num(taxa_segmento, nan=taxa_global) - taxa_global)
+
+    return 1000.0 / (1.0 + np.exp(-logit))
+
+
+def score_arrays(ext: np.ndarray, renda: np.ndarray, credito: np.ndarray, anuidade: np.ndarray,
+                 taxa_segmento: np.ndarray, taxa_global: float, batch_size: int = BATCH_SIZE) -> np.ndarray:
+    """Aplica score_batch em batches de tamanho fixo sobre arrays de coluna."""
+    n = len(renda)
+    scores = np.empty(n, dtype=np.float64)
+    for start in range(0, n, batch_size):
+        end = min(start + batch_size, n)
+        scores[start:end] = score_batch(
+            ext[start:end], renda[start:end], credito[start:end],
+            anuidade[start:end], taxa_segmento[start:end], taxa_global,
+        )
+    return scores
+
+
+def score_dataframe(df: pd.DataFrame, batch_size: int = BATCH_SIZE) -> np.ndarray:
+    """Score para cada linha de application_data (usado na ingestão)."""
+    if df.empty:
+        return np.empty(0)
+
+    taxa_segmento, taxa_global = segment_rates_loo(df)
+
+    ext = np.column_stack([
+        pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float) if c in df.columns else np.full(len(df), np.nan)
+        for c in EXT_SOURCE_COLUMNS
+    ])
+
+    def col(name):
+        return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+
+    return score_arrays(
+        ext, col("renda_total"), col("valor_credito"), col("valor_anuidade"),
+        taxa_segmento, taxa_global, batch_size,
+    )
+
+
+def score_band(scores) -> np.ndarray:
+    """Rótulo da faixa de cada score."""
+    limites = np.array([limite for limite, _ in SCORE_BANDS[:-1]])
+    rotulos = np.array([rotulo for _, rotulo in SCORE_BANDS])
+    return rotulos[np.searchsorted(limites, np.asarray(scores, dtype=float), side="right")]
+
+
+def finalize_score_distribution(grouped: pd.DataFrame, total: int) -> pd.DataFrame:
+    """
+    Totais por faixa (índice faixa; quantidade, inadimplentes, score_medio)
+    completados com as faixas vazias, com percentual e taxa.
+    """
+    grouped = grouped.reindex([rotulo for _, rotulo in SCORE_BANDS], fill_value=0).reset_index()
+
+    grouped["percentual"] = grouped["quantidade"] / total * 100
+    grouped["taxa_inadimplencia"] = np.where(
+        grouped["quantidade"] > 0, grouped["inadimplentes"] / grouped["quantidade"].clip(lower=1) * 100, 0.0
+    )
+    return grouped
+
+
+def calculate_score_distribution(df: pd.DataFrame) -> pd.DataFrame:
+    """Distribuição dos contratos por faixa de score, com a inadimplência observada."""
+    if df.empty or SCORE_COLUMN not in df.columns:
+        return pd.DataFrame()
+
+    df_work = pd.DataFrame({
+        "faixa": score_band(df[SCORE_COLUMN]),
+        "inadimplente": (df["alvo_inadimplencia"] == 1).astype(int),
+        "score": df[SCORE_COLUMN].astype(float),
+    })
+    grouped = df_work.groupby("faixa").agg(
+        quantidade=("inadimplente", "count"),
+        inadimplentes=("inadimplente", "sum"),
+        score_medio=("score", "mean"),
+    )
+    return finalize_score_distribution(grouped, len(df_work))
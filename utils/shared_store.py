@@ -0,0 +1,160 @@
+"""
+Shared Store — Tabela fato colunar em memmap, compartilhada entre sessões
+
+Cada coluna vira um arquivo .npy em data/cache/store-<versão>/. Todas as
+sessões (e processos) do host mapeiam os mesmos arquivos com mmap_mode="r",
+então o SO mantém uma única cópia em memória. A seleção de linhas fica com o
+bitmap index (utils/bitmap_index.py).
+"""
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.database import CHUNK_SIZE, get_connection, get_data_version, get_table_columns, iter_application_data
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache")
+
+# Colunas numéricas e seus dtypes no store
+NUMERIC_COLUMNS = {
+    "id_cliente_atual": "int64",
+    "alvo_inadimplencia": "int64",
+    "valor_credito": "float64",
+    "valor_total_bem": "float64",
+    "valor_anuidade": "float64",
+    "renda_total": "float64",
+    "idade_anos": "float64",
+    "score_risco": "float64",
+}
+
+# Colunas categóricas, codificadas como int16 (-1 = nulo)
+CATEGORICAL_COLUMNS = ["genero", "tipo_contrato", "faixa_etaria", "escolaridade", "tipo_renda"]
+
+DATE_COLUMN = "data_registro"
+
+# Quantas versões do store manter em disco
+KEEP_VERSIONS = 2
+
+
+class SharedTable:
+    """Arrays colunares (memmap, somente leitura) + vocabulários das categorias."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.n_rows = meta["n_rows"]
+        self.vocab = meta["vocab"]
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in meta["columns"]
+        }
+        # Lookup código -> valor; o código -1 cai no último item (None)
+        self._decode = {
+            name: np.array(values + [None], dtype=object) for name, values in self.vocab.items()
+        }
+
+    def to_frame(self, rows: np.ndarray = None) -> pd.DataFrame:
+        """Materializa só as linhas selecionadas (índices ou máscara)."""
+        data = {}
+        for name, values in self.columns.items():
+            selected = values if rows is None else values[rows]
+            if name in self._decode:
+                data[name] = self._decode[name][selected]
+            elif name == DATE_COLUMN:
+                data[name] = pd.to_datetime(selected).strftime("%Y-%m-%d")
+            else:
+                data[name] = np.asarray(selected)
+        return pd.DataFrame(data)
+
+
+def _store_path(version: str) -> str:
+    return os.path.join(CACHE_DIR, f"store-{version}")
+
+
+def build_store(version: str) -> str:
+    """Materializa application_data em arquivos .npy colunares (streaming)."""
+    path = _store_path(version)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+
+    conn = get_connection(version)
+    n_rows = conn.execute("SELECT COUNT(*) FROM application_data").fetchone()[0]
+    vocab = {
+        name: [row[0] for row in conn.execute(
+            f'SELECT DISTINCT "{name}" FROM application_data WHERE "{name}" IS NOT NULL ORDER BY 1'
+        )]
+        for name in CATEGORICAL_COLUMNS
+    }
+    conn.close()
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp_path, exist_ok=True)
+
+    dtypes = dict(NUMERIC_COLUMNS)
+    dtypes.update({name: "int16" for name in CATEGORICAL_COLUMNS})
+    dtypes[DATE_COLUMN] = "datetime64[D]"
+    arrays = {
+        name: np.lib.format.open_memmap(os.path.join(tmp_path, f"{name}.npy"), mode="w+", dtype=dtype, shape=(n_rows,))
+        for name, dtype in dtypes.items()
+    }
+
+    # Bancos gerados antes de uma coluna existir: ela fica nula no store
+    existing = {name for name, _ in get_table_columns(version=version)}
+    offset = 0
+    columns = [c for c in dtypes if c in existing]
+    for chunk in iter_application_data(columns=columns, chunksize=CHUNK_SIZE, version=version):
+        end = offset + len(chunk)
+        for name in NUMERIC_COLUMNS:
+            if name not in chunk.columns:
+                arrays[name][offset:end] = 0 if np.issubdtype(np.dtype(dtypes[name]), np.integer) else np.nan
+                continue
+            values = pd.to_numeric(chunk[name], errors="coerce")
+            if np.issubdtype(np.dtype(dtypes[name]), np.integer):
+                values = values.fillna(0)
+            arrays[name][offset:end] = values.to_numpy(dtype=dtypes[name])
+        for name in CATEGORICAL_COLUMNS:
+            codes = pd.Categorical(chunk[name], categories=vocab[name]).codes
+            arrays[name][offset:end] = codes
+        arrays[DATE_COLUMN][offset:end] = pd.to_datetime(chunk[DATE_COLUMN], errors="coerce").to_numpy(dtype="datetime64[D]")
+        offset = end
+
+    for array in arrays.values():
+        array.flush()
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"n_rows": n_rows, "vocab": vocab, "columns": list(dtypes)}, f)
+
+    # Publicação atômica: outro processo pode ter construído a mesma versão
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    _cleanup_old_versions(keep=os.path.basename(path))
+    return path
+
+
+def _cleanup_old_versions(keep: str):
+    if not os.path.isdir(CACHE_DIR):
+        return
+    stores = sorted(
+        (d for d in os.listdir(CACHE_DIR) if d.startswith("store-") and ".tmp-" not in d),
+        key=lambda d: os.path.getmtime(os.path.join(CACHE_DIR, d)),
+        reverse=True,
+    )
+    for name in [d for d in stores if d != keep][KEEP_VERSIONS - 1:]:
+        # Arquivos ainda mapeados por outro processo continuam válidos (POSIX)
+        shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+
+
+@lru_cache(maxsize=KEEP_VERSIONS)
+def _load(version: str) -> SharedTable:
+    return SharedTable(build_store(version))
+
+
+def get_shared_table(version: str = None) -> SharedTable:
+    """Tabela compartilhada da versão atual dos dados (uma por processo)."""
+    return _load(version or get_data_version())
+
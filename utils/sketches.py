@@ -0,0 +1,160 @@
+"""
+Sketches — Quantis mescláveis por célula (mês × genero × tipo_contrato × faixa_etaria)
+
+Cada valor cai num bucket logarítmico de razão GAMMA (estilo DDSketch), com
+limites globais fixos: o sketch de uma célula é só a contagem por bucket e
+mesclar células é somar contagens. Qualquer quantil tem erro relativo de no
+máximo RELATIVE_ACCURACY. Os sketches são gerados na ingestão
+(setup_database.py), então o dashboard nunca ordena contratos para obter
+mediana, p90 ou p99.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.database import get_connection, get_data_version
+from utils.shared_store import KEEP_VERSIONS
+
+SKETCH_TABLE = "quantile_sketches"
+
+# Colunas com sketch e dimensões de cada célula
+SKETCH_COLUMNS = ["valor_credito", "renda_total"]
+SKETCH_DIMENSIONS = ["genero", "tipo_contrato", "faixa_etaria"]
+
+# Filtro global -> dimensão
+FILTER_DIMENSIONS = {"gender": "genero", "contractType": "tipo_contrato", "ageRange": "faixa_etaria"}
+
+# Erro relativo máximo dos quantis
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(GAMMA)
+
+# Valores abaixo disso (inclusive zero) vão para o primeiro bucket
+MIN_VALUE = 1.0
+
+
+def bucket_index(values) -> np.ndarray:
+    """Bucket de cada valor: ceil(log_gamma(valor))."""
+    values = np.maximum(np.asarray(values, dtype=float), MIN_VALUE)
+    return np.ceil(np.log(values) / _LOG_GAMMA).astype(np.int64)
+
+
+def bucket_value(index) -> np.ndarray:
+    """Representante do bucket, com erro relativo ≤ RELATIVE_ACCURACY para todo o intervalo."""
+    return 2 * GAMMA ** np.asarray(index, dtype=float) / (GAMMA + 1)
+
+
+def build_sketches(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sketches em formato longo (coluna, mes, dimensões, bucket, contagem),
+    uma linha por bucket não vazio de cada célula. Usado na ingestão.
+    """
+    mes = pd.to_datetime(df["data_registro"], errors="coerce").dt.strftime("%Y-%m")
+    partes = []
+    for column in SKETCH_COLUMNS:
+        values = pd.to_numeric(df[column], errors="coerce")
+        valid = values.notna()
+        cells = pd.DataFrame({"mes": mes[valid], **{d: df.loc[valid, d] for d in SKETCH_DIMENSIONS}})
+        cells["bucket"] = bucket_index(values[valid])
+        counts = cells.groupby(list(cells.columns), dropna=False).size().rename("contagem").reset_index()
+        counts.insert(0, "coluna", column)
+        partes.append(counts)
+    return pd.concat(partes, ignore_index=True)
+
+
+class QuantileSketch:
+    """Histograma denso de buckets a partir de `offset`."""
+
+    def __init__(self, counts: np.ndarray, offset: int = 0):
+        self.counts = counts
+        self.offset = offset
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def quantile(self, q: float) -> float:
+        """Quantil q (0–1); NaN se o sketch estiver vazio."""
+        if not self.count:
+            return float("nan")
+        rank = q * (self.count - 1)
+        pos = int(np.searchsorted(np.cumsum(self.counts), rank, side="right"))
+        return float(bucket_value(self.offset + min(pos, len(self.counts) - 1)))
+
+    def histogram(self, n_bins: int = 20) -> pd.DataFrame:
+        """Reagrupa os buckets em até n_bins faixas log-espaçadas (limite inferior, contagem)."""
+        nonzero = np.flatnonzero(self.counts)
+        if not len(nonzero):
+            return pd.DataFrame(columns=["inicio", "fim", "quantidade"])
+        first, last = nonzero[0], nonzero[-1] + 1
+        width = max(1, int(np.ceil((last - first) / n_bins)))
+        starts = np.arange(first, last, width)
+        counts = np.add.reduceat(self.counts[first:last], starts - first)
+        limites = GAMMA ** (self.offset + np.append(starts, starts[-1] + width) - 1.0)
+        return pd.DataFrame({"inicio": limites[:-1], "fim": limites[1:], "quantidade": counts.astype(int)})
+
+
+class SketchStore:
+    """Sketches de todas as células em arrays esparsos (uma entrada por bucket não vazio)."""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.columns = {}
+        for column, part in frame.groupby("coluna"):
+            mes = pd.to_datetime(part["mes"], format="%Y-%m", errors="coerce")
+            self.columns[column] = {
+                "year": mes.dt.year.fillna(-1).to_numpy(dtype=np.int64),
+                "month": mes.dt.month.fillna(-1).to_numpy(dtype=np.int64),
+                **{d: part[d].to_numpy(dtype=object) for d in SKETCH_DIMENSIONS},
+                "bucket": part["bucket"].to_numpy(dtype=np.int64),
+                "contagem": part["contagem"].to_numpy(dtype=float),
+            }
+
+    def merged(self, column: str, filters: dict = None) -> QuantileSketch:
+        """Mescla os sketches das células que satisfazem os filtros (semântica de build_filter_clause)."""
+        data = self.columns.get(column)
+        if data is None or not len(data["bucket"]):
+            return QuantileSketch(np.zeros(0))
+
+        filters = filters or {}
+        mask = np.ones(len(data["bucket"]), dtype=bool)
+        year = filters.get("year", "todos")
+        if year and year != "todos":
+            mask &= data["year"] == int(year)
+            month = filters.get("month", "todos")
+            if month and month != "todos":
+                mask &= data["month"] == int(month)
+        for key, dimension in FILTER_DIMENSIONS.items():
+            value = filters.get(key, "todos")
+            if value and value != "todos":
+                mask &= data[dimension] == value
+
+        buckets = data["bucket"][mask]
+        if not len(buckets):
+            return QuantileSketch(np.zeros(0))
+        offset = int(buckets.min())
+        return QuantileSketch(np.bincount(buckets - offset, weights=data["contagem"][mask]), offset)
+
+    def quantiles(self, column: str, filters: dict = None, qs: list = None) -> dict:
+        """{q: valor} para a coluna e os filtros."""
+        sketch = self.merged(column, filters)
+        return {q: sketch.quantile(q) for q in (qs or [0.5, 0.9, 0.99])}
+
+
+@lru_cache(maxsize=KEEP_VERSIONS)
+def _load(version: str):
+    conn = get_connection(version)
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", [SKETCH_TABLE]
+        ).fetchone()
+        if not exists:
+            return None
+        return SketchStore(pd.read_sql_query(f"SELECT * FROM {SKETCH_TABLE}", conn))
+    finally:
+        conn.close()
+
+
+def get_sketch_store(version: str = None):
+    """Sketches da versão atual dos dados (None se o banco for anterior aos sketches)."""
+    return _load(version or get_data_version())
@@ -0,0 +1,133 @@
+"""
+Validation — Validação vetorizada da ingestão, com quarentena das linhas inválidas
+
+Cada regra é uma máscara booleana calculada sobre a coluna inteira do chunk
+(isna, isin, between, to_numeric/to_datetime com coerce). Linhas que falham
+em qualquer regra vão para a quarentena com os motivos; as demais seguem
+limpas (categorias sem espaços, números convertidos, datas em YYYY-MM-DD).
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from utils.database import FAIXAS_ETARIAS
+
+# Schema de cada tabela (nomes já em snake_case)
+# ranges: coluna -> (mínimo, máximo, inclusive do Series.between); nulos são
+# permitidos salvo se a coluna estiver em required
+# dates: coluna bruta -> (coluna convertida, formato)
+APPLICATION_SCHEMA = {
+    "required": [
+        "id_cliente_atual", "alvo_inadimplencia", "tipo_contrato", "genero",
+        "faixa_etaria", "valor_credito", "renda_total", "data_registro_raw",
+    ],
+    "domains": {
+        "alvo_inadimplencia": [0, 1],
+        "tipo_contrato": ["CASH LOANS", "REVOLVING LOANS"],
+        "genero": ["M", "F"],
+        "faixa_etaria": FAIXAS_ETARIAS,
+        "possui_carro": ["Y", "N"],
+        "possui_imovel": ["Y", "N"],
+    },
+    "ranges": {
+        "valor_credito": (0, np.inf, "right"),
+        "renda_total": (0, np.inf, "right"),
+        "valor_anuidade": (0, np.inf, "both"),
+        "valor_total_bem": (0, np.inf, "both"),
+        "idade_anos": (18, 100, "both"),
+        "qtd_filhos": (0, 20, "both"),
+    },
+    "dates": {
+        "data_registro_raw": ("data_registro", "%d/%m/%Y"),
+    },
+}
+
+PREVIOUS_SCHEMA = {
+    "required": ["id_cliente_anterior", "id_cliente_atual", "status_contrato", "data_decisao_raw"],
+    "domains": {
+        "status_contrato": ["APPROVED", "REFUSED", "CANCELED", "UNUSED OFFER"],
+    },
+    "ranges": {
+        "valor_credito": (0, np.inf, "both"),
+        "valor_solicitado": (0, np.inf, "both"),
+        "valor_anuidade": (0, np.inf, "both"),
+        "valor_entrada": (0, np.inf, "both"),
+        "valor_bens": (0, np.inf, "both"),
+    },
+    "dates": {
+        "data_decisao_raw": ("data_decisao", "%d/%m/%Y"),
+    },
+}
+
+REASON_COLUMN = "motivo"
+
+
+def check_schema(df: pd.DataFrame, schema: dict):
+    """Levanta ValueError se faltar alguma coluna obrigatória."""
+    missing = [c for c in schema["required"] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {missing}")
+
+
+def validate_chunk(df: pd.DataFrame, schema: dict) -> tuple:
+    """
+    Valida e limpa um chunk. Retorna (válidas, quarentena, {motivo: linhas}).
+    A quarentena mantém os valores brutos e ganha a coluna `motivo`.
+    """
+    check_schema(df, schema)
+    checks = {}
+    cleaned = {}
+
+    for col in schema["required"]:
+        checks[f"{col}: ausente"] = df[col].isna()
+
+    for col, values in schema["domains"].items():
+        if col not in df.columns:
+            continue
+        values_col = df[col].str.strip() if pd.api.types.is_string_dtype(df[col]) else df[col]
+        checks[f"{col}: fora do domínio"] = values_col.notna() & ~values_col.isin(values)
+        cleaned[col] = values_col
+
+    for col, (low, high, inclusive) in schema["ranges"].items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        checks[f"{col}: não numérico"] = df[col].notna() & values.isna()
+        checks[f"{col}: fora do intervalo"] = values.notna() & ~values.between(low, high, inclusive=inclusive)
+        cleaned[col] = values
+
+    for col, (target, fmt) in schema["dates"].items():
+        if col not in df.columns:
+            continue
+        parsed = pd.to_datetime(df[col], format=fmt, errors="coerce")
+        checks[f"{col}: data inválida"] = df[col].notna() & parsed.isna()
+        cleaned[target] = parsed.dt.strftime("%Y-%m-%d")
+
+    names = list(checks)
+    failed = np.column_stack([np.asarray(m, dtype=bool) for m in checks.values()])
+    bad = failed.any(axis=1)
+
+    counts = {name: int(n) for name, n in zip(names, failed.sum(axis=0)) if n}
+
+    # Colunas limpas entram de uma vez (sem fragmentar o DataFrame), na ordem original
+    columns = [c for c in df.columns if c not in schema["dates"]]
+    columns += [c for c in cleaned if c not in columns]
+    merged = pd.concat([df.drop(columns=list(cleaned), errors="ignore"), pd.DataFrame(cleaned, index=df.index)], axis=1)
+    # Caso comum (chunk todo válido): evita o filtro booleano, que copia todas as colunas
+    valid = merged.loc[~bad, columns] if bad.any() else merged[columns]
+
+    quarantine = df.loc[bad].copy()
+    quarantine[REASON_COLUMN] = ["; ".join(np.compress(row, names)) for row in failed[bad]]
+    return valid, quarantine, counts
+
+
+def validate_chunks(chunks, schema: dict) -> tuple:
+    """validate_chunk sobre um iterável de chunks; concatena e soma as contagens."""
+    valid, quarantine, counts = [], [], Counter()
+    for chunk in chunks:
+        ok, bad, chunk_counts = validate_chunk(chunk, schema)
+        valid.append(ok)
+        quarantine.append(bad)
+        counts.update(chunk_counts)
+    return pd.concat(valid, ignore_index=True), pd.concat(quarantine, ignore_index=True), dict(counts)
@@ -0,0 +1,118 @@
+"""
+What-if — Simulação de corte de segmentos sobre agregados pré-calculados
+
+Os contratos são agregados uma vez num cubo escolaridade × tipo_renda ×
+faixa_etaria (contratos, inadimplentes, volume). Cada simulação só soma as
+células mantidas: O(segmentos), sem reler os contratos.
+"""
+import numpy as np
+import pandas as pd
+
+SEGMENT_DIMENSIONS = ["escolaridade", "tipo_renda", "faixa_etaria"]
+
+NAO_INFORMADO = "N/A"
+
+
+class SegmentCube:
+    """Cubo denso de agregados por segmento."""
+
+    def __init__(self, labels: list, contratos: np.ndarray, inadimplentes: np.ndarray, volume: np.ndarray):
+        self.labels = labels
+        self.contratos = contratos
+        self.inadimplentes = inadimplentes
+        self.volume = volume
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dimensions: list = None) -> "SegmentCube":
+        """Agrega os contratos em uma única passada (groupby nas dimensões)."""
+        if df.empty:
+            return cls._build(df, dimensions, None, None, None)
+        return cls._build(
+            df, dimensions, None,
+            (df["alvo_inadimplencia"] == 1).to_numpy(dtype=float),
+            df["valor_credito"].astype(float).to_numpy(),
+        )
+
+    @classmethod
+    def from_groups(cls, groups: pd.DataFrame, dimensions: list = None) -> "SegmentCube":
+        """
+        Cubo a partir de agregados já somados por combinação das dimensões
+        (colunas contratos, inadimplentes, volume), como os do modo out-of-core.
+        """
+        return cls._build(
+            groups, dimensions,
+            groups["contratos"].to_numpy(dtype=float),
+            groups["inadimplentes"].to_numpy(dtype=float),
+            groups["volume"].to_numpy(dtype=float),
+        )
+
+    @classmethod
+    def _build(cls, frame: pd.DataFrame, dimensions: list, contratos, inadimplentes, volume) -> "SegmentCube":
+        dimensions = dimensions or SEGMENT_DIMENSIONS
+        if frame.empty:
+            shape = tuple(0 for _ in dimensions)
+            return cls([[] for _ in dimensions], np.zeros(shape), np.zeros(shape), np.zeros(shape))
+
+        keys = [frame[d].fillna(NAO_INFORMADO) for d in dimensions]
+        codes, labels = zip(*(pd.factorize(k, sort=True) for k in keys))
+        shape = tuple(len(l) for l in labels)
+        flat = np.ravel_multi_index(codes, shape)
+        size = int(np.prod(shape))
+
+        def agg(weights=None):
+            return np.bincount(flat, weights=weights, minlength=size).reshape(shape)
+
+        return cls([list(l) for l in labels], agg(contratos), agg(inadimplentes), agg(volume))
+
+    def segments(self) -> pd.DataFrame:
+        """Células não vazias em formato longo, com a taxa de cada segmento."""
+        idx = np.nonzero(self.contratos)
+        data = {f"dim_{i}": np.asarray(self.labels[i], dtype=object)[pos] for i, pos in enumerate(idx)}
+        data["segmento"] = [" + ".join(parts) for parts in zip(*data.values())]
+        data["qtd_contratos"] = self.contratos[idx].astype(int)
+        data["inadimplentes"] = self.inadimplentes[idx].astype(int)
+        data["volume_exposto"] = self.volume[idx]
+        segs = pd.DataFrame(data)
+        segs["taxa_inadimplencia"] = segs["inadimplentes"] / segs["qtd_contratos"] * 100
+        return segs
+
+    def exclusion_mask(self, excluded_values: list = None, excluded_cells: list = None) -> np.ndarray:
+        """
+        Máscara de células cortadas.
+        excluded_values: por dimensão, valores cortados por inteiro.
+        excluded_cells: tuplas de rótulos (uma por dimensão) cortadas individualmente.
+        """
+        mask = np.zeros(self.contratos.shape, dtype=bool)
+        for dim, values in enumerate(excluded_values or []):
+            if not values:
+                continue
+            hit = np.isin(np.asarray(self.labels[dim], dtype=object), list(values))
+            shape = [1] * mask.ndim
+            shape[dim] = -1
+            mask |= hit.reshape(shape)
+        for cell in excluded_cells or []:
+            try:
+                mask[tuple(self.labels[d].index(v) for d, v in enumerate(cell))] = True
+            except ValueError:
+                continue
+        return mask
+
+    def simulate(self, excluded_values: list = None, excluded_cells: list = None) -> dict:
+        """Carteira resultante após cortar os segmentos, comparada com a atual."""
+        keep = ~self.exclusion_mask(excluded_values, excluded_cells)
+        contratos = self.contratos[keep].sum()
+        inadimplentes = self.inadimplentes[keep].sum()
+        volume = self.volume[keep].sum()
+
+        base_contratos = self.contratos.sum()
+        base_taxa = self.inadimplentes.sum() / base_contratos * 100 if base_contratos else 0
+        taxa = inadimplentes / contratos * 100 if contratos else 0
+        return {
+            "contratos": int(contratos),
+            "inadimplentes": int(inadimplentes),
+            "volume": float(volume),
+            "taxa_inadimplencia": float(taxa),
+            "delta_taxa": float(taxa - base_taxa),
+            "contratos_cortados": int(base_contratos - contratos),
+            "volume_cortado": float(self.volume.sum() - volume),
+        }